@@ -1,4 +1,6 @@
 from google.cloud import pubsub_v1, bigquery
+from src import extraction_cache
+from src.bigquery_cost import run_query
 import logging
 import sys
 
@@ -45,5 +47,13 @@ UNNEST(lines.metadata) AS metadata
       and _FILE_NAME = 'gs://ingesta-pruebas-cofers-domingo/{partitions['file_name']}'
     """
     logging.info(f"Querying BigQuery: {query}")
-    query_job = bq_client.query(query)
-    return [dict(row) for row in query_job]
\ No newline at end of file
+    rows = run_query(bq_client, query, label="raw_transactions")
+    return [dict(row) for row in rows]
+
+
+def query_raw_transactions_cached(partitions):
+    """
+    Igual que query_raw_transactions, pero sirve desde la caché local de extracción
+    cuando el mismo archivo (particiones + generación) ya se extrajo.
+    """
+    return extraction_cache.cached(query_raw_transactions, partitions)
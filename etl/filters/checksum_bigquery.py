@@ -1,4 +1,6 @@
 from google.cloud import bigquery
+from src import metrics
+from src.bigquery_cost import run_query, QueryBudgetExceeded
 import logging
 import os
 
@@ -17,6 +19,8 @@ def unique_ids(rows):
     """
     Extracts unique IDs from a list of rows.
     """
+    if not rows:
+        return rows
     checksum_list_bq = get_checksums_from_bigquery(rows[0]['company_id'], 'checksum')
     final_data = filter_rows_by_checksums(rows, checksum_list_bq, 'checksum')
     logging.info(f"Transactions after checksums: {len(final_data)}")
@@ -55,11 +59,20 @@ def get_checksums_from_bigquery(company_id, checksum_type):
         ]
     )
 
+    def skip_bigquery_dedup():
+        # Política 'reroute': sin el histórico de BigQuery solo deduplica Redis (con su TTL),
+        # así que se deja constancia en el log y en las métricas.
+        logging.error(f"BigQuery {checksum_type} dedup skipped for company {company_id}: query over budget")
+        metrics.increment(f"checksum_bigquery_dedup_skipped.{checksum_type}")
+        return []
+
     try:
-        query_job = client.query(query, job_config=job_config)
-        result_checksums = [row[checksum_type] for row in query_job.result()]
+        rows = run_query(client, query, job_config=job_config, label=f"{checksum_type}s", fallback=skip_bigquery_dedup)
+        result_checksums = [row[checksum_type] for row in rows]
         logging.debug(f"Total {checksum_type}s from BigQuery: {len(result_checksums)}")
         return result_checksums
+    except QueryBudgetExceeded:
+        raise
     except Exception as e:
         logging.error(f"Failed to query BigQuery: {e}")
         return []
@@ -1,2 +1,2 @@
-def insert():
+def insert(data):
     pass
\ No newline at end of file
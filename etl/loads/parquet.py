@@ -0,0 +1,197 @@
+from datetime import date, datetime
+import logging
+import os
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from theetl.transaction import INTERNED_FIELDS, to_transactions
+
+
+# Destino local (/ruta) o en GCS (gs://bucket/prefijo); sin configurar, la carga se omite
+SNAPSHOT_PATH = os.getenv("PARQUET_SNAPSHOT_PATH")
+# Filas por llamada (lote del checkpoint de este sink): cada llamada escribe un archivo por partición
+FILE_ROWS = int(os.getenv("PARQUET_FILE_ROWS", 100000))
+ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", 10000))
+COMPRESSION = os.getenv("PARQUET_COMPRESSION", "snappy")
+_warned_unset = False
+
+SCHEMA = pa.schema([
+    ('checksum', pa.string()),
+    ('etl_checksum', pa.string()),
+    ('concept', pa.string()),
+    ('amount', pa.float64()),
+    ('account_number', pa.string()),
+    ('bank', pa.string()),
+    ('account_alias', pa.string()),
+    ('currency', pa.string()),
+    ('report_type', pa.string()),
+    ('extraction_date', pa.string()),
+    ('user_id', pa.string()),
+    ('company_id', pa.string()),
+    ('transaction_date', pa.string()),
+    ('reported_remaining', pa.float64()),
+    ('created_at', pa.string()),
+    ('metadata', pa.map_(pa.string(), pa.string())),
+])
+# Columnas de baja cardinalidad (las mismas que se internan en Transaction)
+DICTIONARY_COLUMNS = [name for name in SCHEMA.names if name in INTERNED_FIELDS]
+
+
+def write(data):
+    """
+    Escribe las transacciones transformadas como Parquet particionado por
+    year/month/day/company_id (el mismo layout que parse_partitions) en PARQUET_SNAPSHOT_PATH.
+    Cada llamada crea un archivo por partición; las filas se acumulan por partición
+    y se vuelcan en row groups de PARQUET_ROW_GROUP_ROWS filas.
+
+    Los archivos se escriben con un nombre temporal oculto y solo se publican cuando
+    todos se cerraron bien; si algo falla se eliminan, así un lote que el checkpoint
+    no confirmó no deja filas duplicadas al reintentarse.
+    """
+    global _warned_unset
+    if not SNAPSHOT_PATH:
+        if not _warned_unset:
+            logging.warning("PARQUET_SNAPSHOT_PATH is not set, skipping Parquet snapshot.")
+            _warned_unset = True
+        return
+    if not data:
+        return
+    filesystem, base_path = fs.FileSystem.from_uri(SNAPSHOT_PATH)
+    writer = SnapshotWriter(filesystem, base_path)
+    try:
+        for row in to_transactions(data):
+            writer.add(row)
+        writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+    logging.info(f"Parquet snapshot: {len(data)} transactions in {len(writer.published)} files")
+
+
+# El ETL carga este sink en lotes de FILE_ROWS filas en lugar del lote del checkpoint
+write.batch_size = FILE_ROWS
+
+
+def partition_path(row):
+    """Ruta de partición year=/month=/day=/company_id= de una transacción."""
+    report_date = parse_row_date(row.get('created_at')) or parse_row_date(row.get('transaction_date'))
+    company_id = row.get('company_id') or 'unknown'
+    if report_date is None:
+        return f"year=unknown/month=unknown/day=unknown/company_id={company_id}"
+    return f"year={report_date.year}/month={report_date.month}/day={report_date.day}/company_id={company_id}"
+
+
+def parse_row_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return None
+
+
+class SnapshotWriter:
+    """
+    Buffers por partición con un ParquetWriter abierto por cada una. Escribe en
+    ``_part-<uuid>.parquet.tmp`` (ignorado por los lectores) hasta commit().
+    """
+
+    def __init__(self, filesystem, base_path, row_group_rows=ROW_GROUP_ROWS):
+        self.filesystem = filesystem
+        self.base_path = base_path.rstrip('/')
+        self.row_group_rows = row_group_rows
+        self.file_name = f"part-{uuid.uuid4().hex}.parquet"
+        self.buffers = {}
+        self.writers = {}
+        self.paths = {}
+        self.published = []
+
+    def add(self, row):
+        partition = partition_path(row)
+        buffer = self.buffers.setdefault(partition, [])
+        buffer.append(row)
+        if len(buffer) >= self.row_group_rows:
+            self.flush(partition)
+
+    def flush(self, partition):
+        rows = self.buffers.pop(partition, None)
+        if not rows:
+            return
+        writer = self.writers.get(partition)
+        if writer is None:
+            directory = f"{self.base_path}/{partition}"
+            self.filesystem.create_dir(directory, recursive=True)
+            tmp_path = f"{directory}/_{self.file_name}.tmp"
+            self.paths[partition] = (tmp_path, f"{directory}/{self.file_name}")
+            writer = pq.ParquetWriter(
+                tmp_path,
+                SCHEMA,
+                filesystem=self.filesystem,
+                use_dictionary=DICTIONARY_COLUMNS,
+                compression=COMPRESSION,
+            )
+            self.writers[partition] = writer
+        writer.write_table(to_table(rows), row_group_size=self.row_group_rows)
+
+    def commit(self):
+        """Vuelca los buffers, cierra todos los archivos y recién entonces los publica."""
+        for partition in list(self.buffers):
+            self.flush(partition)
+        while self.writers:
+            _, writer = self.writers.popitem()
+            writer.close()
+        for tmp_path, path in self.paths.values():
+            self.filesystem.move(tmp_path, path)
+            self.published.append(path)
+
+    def abort(self):
+        """Descarta lo escrito en esta llamada sin ocultar el error original."""
+        self.buffers.clear()
+        for writer in self.writers.values():
+            try:
+                writer.close()
+            except Exception as e:
+                logging.warning(f"Error closing Parquet writer during abort: {e}")
+        self.writers.clear()
+        for tmp_path, path in self.paths.values():
+            for leftover in (tmp_path, path):
+                try:
+                    self.filesystem.delete_file(leftover)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logging.warning(f"Could not delete Parquet file {leftover}: {e}")
+        self.published.clear()
+
+
+def to_table(rows):
+    """Construye la tabla Arrow columna a columna a partir de registros Transaction."""
+    columns = []
+    for field in SCHEMA:
+        values = [row.get(field.name) for row in rows]
+        if field.name == 'metadata':
+            values = [
+                [(str(key), None if value is None else str(value)) for key, value in (metadata or {}).items()]
+                for metadata in values
+            ]
+        elif pa.types.is_floating(field.type):
+            values = [None if value is None else float(value) for value in values]
+        else:
+            values = [to_string(value) for value in values]
+        columns.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(columns, schema=SCHEMA)
+
+
+def to_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
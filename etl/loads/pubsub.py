@@ -1,42 +1,70 @@
-from src.pubsub import publish_response
+from src.pubsub import publish_bytes, wait_for_publish
+from src.serialization import dumps, compress
+from theetl.transaction import Transaction, to_transactions
 import os
 import logging
 
+# Fields that are not needed in the Pub/Sub message
+EXCLUDED_FIELDS = ('created_at', 'etl_checksum')
+
 def push_fake(data):
     logging.info("Pushing data to pubsub")
     return data
 
 def push(data):
     print("Pushing data to pubsub")
-    for transaction in data:  # Asume que 'data' es una lista de transacciones
-        pubsub_data = prepare_for_pubsub(transaction)
-        if pubsub_data:  # Asegurarse de que la preparación fue exitosa
-            logging.debug(f"Data to publish: {pubsub_data}")
-            publish_response(pubsub_data, topic=os.environ.get("TOPIC_IN"))
+    topic = os.environ.get("TOPIC_IN")
+    futures = []
+    # Convierte en el sink las filas dict que pudiera entregar otra etapa a registros Transaction
+    for transaction in to_transactions(data):
+        message_bytes, attributes = encode_for_pubsub(transaction)
+        if message_bytes:  # Asegurarse de que la preparación fue exitosa
+            logging.debug(f"Data to publish: {message_bytes[:512]}")
+            futures.append(publish_bytes(message_bytes, topic, **attributes))
         else:
             logging.error("Failed to prepare transaction data for publishing")
+    # Publica el lote en paralelo y falla si algún mensaje no se publicó, para no confirmar el lote
+    wait_for_publish(futures)
+
+def encode_for_pubsub(transaction):
+    """
+    Serializes a transformed row into the Pub/Sub payload, compressing large messages.
+    Returns (None, {}) when the row cannot be prepared.
+    """
+    transaction_data = prepare_for_pubsub(transaction)
+    if not transaction_data:
+        return None, {}
+    return compress(dumps(transaction_data))
 
 def prepare_for_pubsub(transaction):
-    if not isinstance(transaction, dict):
-        logging.error("Transaction data must be a dictionary.")
+    if not isinstance(transaction, Transaction):
+        logging.error("Transaction data must be a Transaction record (see theetl.transaction.to_transactions).")
         return None
+    # Build only the message fields straight from the slots (everything but EXCLUDED_FIELDS),
+    # in the legacy key order, instead of building the full row and popping
+    return {
+        'checksum': transaction.checksum,
+        'concept': transaction.concept,
+        'amount': transaction.amount,
+        'account_number': transaction.account_number,
+        'bank': transaction.bank,
+        'account_alias': transaction.account_alias,
+        'currency': transaction.currency,
+        'report_type': transaction.report_type,
+        'extraction_date': transaction.extraction_date,
+        'user_id': transaction.user_id,
+        'company_id': transaction.company_id,
+        'transaction_date': transaction.transaction_date,
+        'reported_remaining': transaction.reported_remaining,
+        'metadata': prepare_metadata(transaction.metadata),
+    }
 
-    transaction_data = transaction.copy()  # Make a copy to avoid modifying the original dictionary
-    
+def prepare_metadata(metadata):
     # Ensure that metadata is a dictionary, handle empty or improperly formatted metadata
-    metadata = transaction_data.get('metadata', [])
     if isinstance(metadata, list) and metadata:
         try:
-            metadata_dict = {item['key']: item['value'] for item in metadata}
-            transaction_data['metadata'] = metadata_dict
+            return {item['key']: item['value'] for item in metadata}
         except (TypeError, KeyError) as e:
             logging.error(f"Error converting metadata: {e}")
-            transaction_data['metadata'] = {}  # Set to empty dict if conversion fails
-    else:
-        transaction_data['metadata'] = {}  # Also set to empty dict if metadata is empty or not a list
-
-    # Eliminate fields that are not needed in the Pub/Sub message
-    transaction_data.pop('created_at', None)
-    transaction_data.pop('etl_checksum', None)
-    
-    return transaction_data
\ No newline at end of file
+            return {}  # Set to empty dict if conversion fails
+    return {}  # Also set to empty dict if metadata is empty or not a list
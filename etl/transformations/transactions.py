@@ -1,6 +1,7 @@
 from datetime import datetime
 import logging
 from src.transformations import prepare_metadata
+from theetl.transaction import Transaction
 import hashlib
 
 
@@ -25,24 +26,24 @@ def process_transactions(records):
             transaction_date = fix_date_format(record['transaction_date']) if record.get('transaction_date') else None
             created_at = parse_date(record['created_at']).strftime('%Y-%m-%dT00:00:00') if record.get('created_at') else None
 
-            rows.append({
-                'checksum': record['checksum'],
-                'etl_checksum': etl_checksum,
-                'concept': record.get('concept', ''),
-                'amount': record.get('amount', 0),
-                'account_number': record.get('account_number', ''),
-                'bank': record.get('bank', ''),
-                'account_alias': record.get('account_alias', ''),
-                'currency': record.get('currency', ''),
-                'report_type': record.get('report_type', ''),
-                'extraction_date': record.get('extraction_date'),
-                'user_id': record.get('userId', ''),  # Ajustado a la consulta
-                'company_id': record.get('companyId', ''),  # Ajustado a la consulta
-                'transaction_date': transaction_date,
-                'reported_remaining': record.get('reported_remaining', 0),
-                'created_at': created_at,
-                'metadata': metadata_dict  # Reconstrucción del diccionario
-            })
+            rows.append(Transaction(
+                checksum=record['checksum'],
+                etl_checksum=etl_checksum,
+                concept=record.get('concept', ''),
+                amount=record.get('amount', 0),
+                account_number=record.get('account_number', ''),
+                bank=record.get('bank', ''),
+                account_alias=record.get('account_alias', ''),
+                currency=record.get('currency', ''),
+                report_type=record.get('report_type', ''),
+                extraction_date=record.get('extraction_date'),
+                user_id=record.get('user_id') or record.get('userId', ''),  # Ajustado a la consulta
+                company_id=record.get('company_id') or record.get('companyId', ''),  # Ajustado a la consulta
+                transaction_date=transaction_date,
+                reported_remaining=record.get('reported_remaining', 0),
+                created_at=created_at,
+                metadata=metadata_dict  # Reconstrucción del diccionario
+            ))
 
         except Exception as e:
             logging.error(f"Unexpected error processing record: {e}")
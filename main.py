@@ -3,17 +3,22 @@ import sys
 import time
 from multiprocessing import Manager, Lock
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from google.cloud import pubsub_v1, bigquery
 from src.ai import detect_anomalies
-from src.utils import process_transactions, parse_partitions
+from src.utils import parse_partitions
 from src.bigquery import query_raw_transactions
 import uvicorn
 import base64
 import json
 import redis
-from src import redis_tools
+from src import metrics, redis_tools, refused_files
+from src.admission import AdmissionController, AdmissionRejected
 from theetl.etl import ETL
-from src.redis_tools import filter_unique_transactions, acquire_lock, release_lock
+from src.bigquery_cost import QueryBudgetExceeded
+from src.checkpoints import Checkpoint, file_id
+from src.checksum_store import filter_unseen, mark_processed
+from src.redis_tools import acquire_lock, release_lock, is_file_processed, mark_file_processed
 
 redis_client = redis.Redis(host='localhost', port=6379, decode_responses=True)
 
@@ -35,6 +40,7 @@ logging.basicConfig(
 )
 
 app = FastAPI()
+admission = AdmissionController.from_env()
 
 def check_redis_connection():
     """Verifica la conexión a Redis antes de iniciar la aplicación."""
@@ -93,8 +99,6 @@ def validate_event_data(event_data):
 async def process_event(request: Request):
     """Endpoint para recibir y procesar eventos de Pub/Sub."""
     try:
-        etl = ETL('config/transactions.yaml',"transactions")
-        
         body = await request.json()
         logging.info(f"Evento recibido: {body}")
 
@@ -102,40 +106,93 @@ async def process_event(request: Request):
         event_data = parse_event_body(body)
         bucket_name, file_path = validate_event_data(event_data)
 
-        partitions = parse_partitions(file_path)
-        partitions['file_name'] = file_path 
-        
-        # Run ETL: get data from bigquery
-        rows_to_process=etl.run_extraction(partitions)
-
-        #raw data
-        #rows_to_process = query_raw_transactions(partitions, file_path)
-        logging.info(f"Transacciones ingestadas en raw: {len(rows_to_process)}\n")
-        for row in rows_to_process:
-            logging.info(f"Transacción recuperada: {row}")
-
-        #transformations
-        transactions=etl.run_transformations(rows_to_process)
-        logging.info(f"Transacciones después de transformaciones: {len(transactions)}\n")
-        for transaction in transactions:
-            logging.info(f"Transacción transformada: {transaction}")
-
-        # Detectar anomalías
-        #anomalies = process_anomalies(rows_to_process, bigquery_data)
-        #filtros antes de subir a redis y bigquery
-        
-
-        unique_rows = filter_unique_transactions(redis_client, rows_to_process)
-
-        # Procesar transacciones únicas
-        process_transactions(unique_rows)
-
-        return {"message": f"Procesadas {len(unique_rows)} transacciones, {len(anomalies)} anomalías detectadas."}
-
+        # Control de admisión por tamaño del archivo; el ETL corre fuera del event loop
+        async with admission.admit(event_data):
+            return await run_in_threadpool(handle_event, event_data, bucket_name, file_path)
+
+    except HTTPException:
+        raise
+    except AdmissionRejected as e:
+        logging.warning(f"Evento rechazado por control de admisión ({e.status_code}): {e.reason}")
+        raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    except QueryBudgetExceeded as e:
+        # Se responde 2xx para que Pub/Sub no reenvíe el mismo archivo (y repita el dry run)
+        # indefinidamente; el evento queda en Redis (src.refused_files) para listarlo y
+        # reprocesarlo tras revisar el presupuesto. Si no se puede registrar, se responde
+        # 500 y Pub/Sub lo reintenta: omitirlo sin registro sería perder el archivo.
+        metrics.increment("files_over_budget")
+        logging.error(f"Archivo omitido por presupuesto de BigQuery: gs://{bucket_name}/{file_path}: {e}")
+        try:
+            refused_key = refused_files.record(redis_client, event_data, e)
+        except Exception as record_error:
+            logging.error(f"No se pudo registrar el archivo omitido: {record_error}")
+            raise HTTPException(status_code=500, detail=f"Error registrando el archivo omitido: {record_error}")
+        return {
+            "message": "Archivo omitido: la consulta supera el presupuesto de BigQuery.",
+            "error": str(e),
+            "refused_key": refused_key,
+        }
     except Exception as e:
         logging.error(f"Error procesando el evento: {str(e)}")
         raise HTTPException(status_code=500, detail="Error procesando el evento.")
 
+
+def handle_event(event_data, bucket_name, file_path):
+    """Ejecuta el ETL de un archivo ya admitido."""
+    etl = ETL('config/transactions.yaml',"transactions")
+
+    # Idempotencia a nivel de archivo: misma generación o mismo contenido ya procesado
+    if is_file_processed(redis_client, event_data):
+        metrics.increment("files_skipped")
+        logging.info(f"Archivo ya procesado, se omite: gs://{bucket_name}/{file_path}")
+        return {"message": "Archivo ya procesado, se omite."}
+
+    partitions = parse_partitions(file_path)
+    partitions['file_name'] = file_path 
+    partitions['generation'] = event_data.get('generation')  # clave de la caché de extracción
+    
+    # Run ETL: get data from bigquery
+    rows_to_process=etl.run_extraction(partitions)
+
+    #raw data
+    #rows_to_process = query_raw_transactions(partitions, file_path)
+    logging.info(f"Transacciones ingestadas en raw: {len(rows_to_process)}\n")
+    for row in rows_to_process:
+        logging.info(f"Transacción recuperada: {row}")
+
+    #transformations
+    transactions=etl.run_transformations(rows_to_process)
+    logging.info(f"Transacciones después de transformaciones: {len(transactions)}\n")
+    for transaction in transactions:
+        logging.info(f"Transacción transformada: {transaction}")
+
+    # Detectar anomalías
+    #anomalies = process_anomalies(rows_to_process, bigquery_data)
+    #filtros antes de subir a redis y bigquery
+    transactions = etl.run_filters(transactions)
+
+    # Los checksums se consultan aquí pero se marcan como procesados solo después de cargar
+    unique_rows = filter_unseen(redis_client, transactions)
+    logging.info(f"Transacciones únicas a procesar: {len(unique_rows)} de {len(transactions)}")
+
+    # Carga por lotes con checkpoint: un reintento continúa desde el último lote confirmado
+    checkpoint = Checkpoint(redis_client, file_id(event_data))
+    etl.run_loads(unique_rows, checkpoint=checkpoint)
+
+    mark_processed(redis_client, unique_rows)
+    checkpoint.clear(etl.load_names)
+    mark_file_processed(redis_client, event_data)
+    metrics.increment("files_processed")
+    logging.info(f"Bytes estimados en BigQuery por etapa: {etl.estimated_bytes()}")
+
+    return {"message": f"Procesadas {len(unique_rows)} transacciones."}
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Métricas en memoria del worker que atiende la petición."""
+    return metrics.snapshot()
+
 if __name__ == "__main__":
     check_redis_connection()
     uvicorn.run(app, host="0.0.0.0", port=8081)
@@ -0,0 +1,130 @@
+"""
+Control de admisión del endpoint de eventos, por worker.
+
+El costo de cada evento se estima con el ``size`` del objeto de GCS que trae el
+payload: un punto por cada ADMISSION_UNIT_BYTES (mínimo 1). Los archivos chicos
+comparten un presupuesto de puntos en vuelo (ADMISSION_BUDGET); si no hay lugar,
+se responde 503 con Retry-After y Pub/Sub reintenta más tarde. Los archivos
+grandes (>= ADMISSION_LARGE_FILE_BYTES) van por un carril propio con
+concurrencia y cola acotadas, así no bloquean a los chicos; si la cola está
+llena se responde 429.
+"""
+import asyncio
+import math
+import os
+from contextlib import asynccontextmanager
+
+from src import metrics
+
+
+class AdmissionRejected(Exception):
+    """El evento no se admite ahora; ``retry_after`` en segundos."""
+
+    def __init__(self, status_code, reason, retry_after):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Presupuesto ponderado de trabajo en vuelo para eventos chicos y carril acotado
+    para archivos grandes. Pensado para usarse desde el event loop del worker.
+    """
+
+    def __init__(self, budget=64, unit_bytes=1024 * 1024, large_file_bytes=32 * 1024 * 1024,
+                 large_concurrency=1, large_queue_size=2, queue_timeout=60, retry_after=10):
+        self.budget = budget
+        self.unit_bytes = unit_bytes
+        self.large_file_bytes = large_file_bytes
+        self.large_concurrency = large_concurrency
+        self.large_queue_size = large_queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.large_running = 0
+        self.large_waiting = 0
+        self._large_slots = asyncio.Semaphore(large_concurrency)
+
+    @classmethod
+    def from_env(cls):
+        """Crea el controlador con la configuración de las variables de entorno."""
+        return cls(
+            budget=int(os.getenv("ADMISSION_BUDGET", 64)),
+            unit_bytes=int(os.getenv("ADMISSION_UNIT_BYTES", 1024 * 1024)),
+            large_file_bytes=int(os.getenv("ADMISSION_LARGE_FILE_BYTES", 32 * 1024 * 1024)),
+            large_concurrency=int(os.getenv("ADMISSION_LARGE_CONCURRENCY", 1)),
+            large_queue_size=int(os.getenv("ADMISSION_LARGE_QUEUE_SIZE", 2)),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 60)),
+            retry_after=int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 10)),
+        )
+
+    @staticmethod
+    def event_size(event_data):
+        try:
+            return int(event_data.get("size") or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def cost(self, size):
+        """Puntos de presupuesto de un archivo de ``size`` bytes."""
+        return max(1, math.ceil(size / self.unit_bytes))
+
+    def _publish_gauges(self):
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        metrics.set_gauge("admission_large_running", self.large_running)
+        metrics.set_gauge("admission_large_waiting", self.large_waiting)
+
+    def _reject(self, status_code, reason, load):
+        # Cuanto más cargado está el worker, más espera sugerida
+        retry_after = math.ceil(self.retry_after * max(1.0, load))
+        metrics.increment(f"admission_rejected_{status_code}")
+        raise AdmissionRejected(status_code, reason, retry_after)
+
+    @asynccontextmanager
+    async def admit(self, event_data):
+        """Reserva capacidad para el evento durante el bloque o lanza AdmissionRejected."""
+        size = self.event_size(event_data)
+        if size >= self.large_file_bytes:
+            async with self._admit_large():
+                yield
+            return
+
+        weight = self.cost(size)
+        if self.in_flight and self.in_flight + weight > self.budget:
+            self._reject(503, "Presupuesto de trabajo en vuelo agotado.", (self.in_flight + weight) / self.budget)
+        self.in_flight += weight
+        metrics.increment("admission_admitted")
+        self._publish_gauges()
+        try:
+            yield
+        finally:
+            self.in_flight -= weight
+            self._publish_gauges()
+
+    @asynccontextmanager
+    async def _admit_large(self):
+        if self.large_running + self.large_waiting >= self.large_concurrency + self.large_queue_size:
+            self._reject(429, "Cola de archivos grandes llena.", 1 + self.large_waiting / max(self.large_queue_size, 1))
+
+        self.large_waiting += 1
+        self._publish_gauges()
+        try:
+            await asyncio.wait_for(self._large_slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(503, "Tiempo de espera en la cola de archivos grandes agotado.", 2)
+        finally:
+            # También si se agotó la espera o se canceló la petición
+            self.large_waiting -= 1
+            self._publish_gauges()
+
+        self.large_running += 1
+        metrics.increment("admission_admitted_large")
+        self._publish_gauges()
+        try:
+            yield
+        finally:
+            self.large_running -= 1
+            self._large_slots.release()
+            self._publish_gauges()
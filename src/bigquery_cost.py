@@ -0,0 +1,115 @@
+"""
+Control de costo de las consultas a BigQuery.
+
+Las etapas que consultan BigQuery lo hacen a través de run_query(). Fuera de un
+guard se comporta como ``client.query(...).result()``. Dentro de guard() (lo
+abre theetl.etl.ETL en cada etapa según ``cost_control`` de la configuración)
+lanza primero la consulta como dry run, registra los bytes estimados por etapa
+y, si superan ``max_bytes_per_query``, la rechaza (QueryBudgetExceeded) o la
+redirige al ``fallback`` de quien llama.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from src import metrics
+
+
+REFUSE = "refuse"
+REROUTE = "reroute"
+
+_current_guard = contextvars.ContextVar("bigquery_cost_guard", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """Una consulta supera el presupuesto de bytes configurado."""
+
+    def __init__(self, stage, label, estimated_bytes, max_bytes):
+        super().__init__(
+            f"Query {label} in stage {stage} would process {estimated_bytes} bytes (budget {max_bytes})"
+        )
+        self.stage = stage
+        self.label = label
+        self.estimated_bytes = estimated_bytes
+        self.max_bytes = max_bytes
+
+
+class CostGuard:
+    """Configuración de costo de una etapa y registro de sus estimaciones."""
+
+    def __init__(self, stage, dry_run=False, max_bytes_per_query=None, on_exceed=REFUSE, estimates=None):
+        if on_exceed not in (REFUSE, REROUTE):
+            raise ValueError(f"on_exceed must be '{REFUSE}' or '{REROUTE}', got {on_exceed!r}")
+        self.stage = stage
+        self.dry_run = dry_run
+        self.max_bytes_per_query = max_bytes_per_query
+        self.on_exceed = on_exceed
+        self.estimates = estimates if estimates is not None else []
+
+    def record(self, label, estimated_bytes, action):
+        self.estimates.append({
+            "stage": self.stage,
+            "query": label,
+            "estimated_bytes": estimated_bytes,
+            "action": action,
+        })
+        metrics.increment("bq_dry_runs")
+        metrics.increment(f"bq_estimated_bytes.{self.stage}", estimated_bytes)
+        if action != "run":
+            metrics.increment(f"bq_queries_{action}")
+
+
+@contextmanager
+def guard(stage, estimates=None, **cost_control):
+    """Activa el control de costo para las consultas lanzadas dentro del bloque."""
+    token = _current_guard.set(CostGuard(stage, estimates=estimates, **cost_control))
+    try:
+        yield _current_guard.get()
+    finally:
+        _current_guard.reset(token)
+
+
+def estimate_bytes(client, query, job_config=None):
+    """Lanza la consulta como dry run y devuelve los bytes que procesaría."""
+    from google.cloud import bigquery
+
+    dry_run_config = bigquery.QueryJobConfig(
+        dry_run=True,
+        use_query_cache=False,
+        query_parameters=list(job_config.query_parameters) if job_config is not None else [],
+    )
+    query_job = client.query(query, job_config=dry_run_config)
+    return query_job.total_bytes_processed or 0
+
+
+def run_query(client, query, job_config=None, label="query", fallback=None):
+    """
+    Ejecuta una consulta respetando el guard activo y devuelve sus filas.
+
+    Parameters:
+        client: Cliente de BigQuery (o uno falso con la misma interfaz).
+        query (str): SQL de la consulta.
+        job_config: QueryJobConfig opcional (parámetros de la consulta).
+        label (str): Nombre de la consulta en el reporte de costos.
+        fallback (callable): Alternativa sin BigQuery cuando la política es 'reroute'.
+
+    Returns:
+        Las filas de la consulta, o el resultado de ``fallback``.
+    """
+    cost_guard = _current_guard.get()
+    if cost_guard is None or not cost_guard.dry_run:
+        return client.query(query, job_config=job_config).result()
+
+    estimated_bytes = estimate_bytes(client, query, job_config)
+    budget = cost_guard.max_bytes_per_query
+    logging.info(f"Dry run {cost_guard.stage}/{label}: {estimated_bytes} bytes estimados")
+    if budget and estimated_bytes > budget:
+        if cost_guard.on_exceed == REROUTE and fallback is not None:
+            cost_guard.record(label, estimated_bytes, "rerouted")
+            logging.warning(f"Consulta {label} redirigida: {estimated_bytes} bytes superan el presupuesto de {budget}")
+            return fallback()
+        cost_guard.record(label, estimated_bytes, "refused")
+        raise QueryBudgetExceeded(cost_guard.stage, label, estimated_bytes, budget)
+
+    cost_guard.record(label, estimated_bytes, "run")
+    return client.query(query, job_config=job_config).result()
@@ -0,0 +1,66 @@
+"""
+Checkpoints de carga por archivo y por sink en Redis.
+
+Cada sink (función de carga del ETL) registra, lote a lote, los checksums de las
+filas que ya cargó en ``checkpoint:{archivo}:{sink}``, y el número de lotes
+confirmados en ``checkpoint:{archivo}:progress``. Si un reintento del mismo
+archivo (misma generación) llega a la carga, cada sink salta las filas ya
+confirmadas y continúa con el resto. Se guardan checksums y no posiciones porque
+el orden de las filas de BigQuery no está garantizado entre ejecuciones.
+"""
+import logging
+import os
+
+
+CHECKPOINT_TTL_SECONDS = int(os.getenv("CHECKPOINT_TTL_SECONDS", 7 * 24 * 3600))
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", 500))
+
+
+def file_id(event_data):
+    """Identificador del archivo: bucket/nombre#generación."""
+    return f"{event_data.get('bucket')}/{event_data.get('name')}#{event_data.get('generation')}"
+
+
+class Checkpoint:
+    """Lotes confirmados por cada sink durante la carga de un archivo."""
+
+    def __init__(self, redis_client, file_id, batch_size=LOAD_BATCH_SIZE, ttl=CHECKPOINT_TTL_SECONDS):
+        self.redis_client = redis_client
+        self.file_id = file_id
+        self.batch_size = batch_size
+        self.ttl = ttl
+
+    def _sink_key(self, sink):
+        return f"checkpoint:{self.file_id}:{sink}"
+
+    def _progress_key(self):
+        return f"checkpoint:{self.file_id}:progress"
+
+    @staticmethod
+    def row_key(row):
+        return row['checksum']
+
+    def committed(self, sink):
+        """Checksums que el sink ya cargó para este archivo."""
+        return self.redis_client.smembers(self._sink_key(sink))
+
+    def commit(self, sink, rows):
+        """Confirma un lote cargado por el sink."""
+        keys = [self.row_key(row) for row in rows]
+        if not keys:
+            return
+        pipe = self.redis_client.pipeline()
+        pipe.sadd(self._sink_key(sink), *keys)
+        pipe.hincrby(self._progress_key(), sink, 1)
+        pipe.expire(self._sink_key(sink), self.ttl)
+        pipe.expire(self._progress_key(), self.ttl)
+        pipe.execute()
+
+    def progress(self):
+        """Lotes confirmados por sink (incluye intentos anteriores)."""
+        return {sink: int(batches) for sink, batches in self.redis_client.hgetall(self._progress_key()).items()}
+
+    def clear(self, sinks):
+        """Elimina los checkpoints del archivo una vez cargado por completo."""
+        self.redis_client.delete(self._progress_key(), *(self._sink_key(sink) for sink in sinks))
+        logging.info(f"Checkpoints eliminados para {self.file_id}")
@@ -0,0 +1,215 @@
+"""
+Checksums procesados en Redis, particionados por compañía y mes de la transacción.
+
+Cada partición tiene un set exacto ``checksums:{company_id}:{YYYY-MM}`` y un filtro
+de Bloom en un bitmap ``checksums:{company_id}:{YYYY-MM}:bloom``. Ambas claves
+expiran CHECKSUM_TTL_SECONDS después de la última escritura, así el histórico
+antiguo desaparece solo. El Bloom descarta la mayoría de checksums nuevos sin
+consultar el set; solo los positivos (reales o falsos) se verifican con SISMEMBER.
+
+Migración del set global anterior:
+    python -m src.checksum_store migrate --host localhost --port 6379 [--delete]
+"""
+import argparse
+import hashlib
+import logging
+import os
+from datetime import date, datetime
+
+from src import metrics
+
+
+LEGACY_KEY = "processed_checksums"
+KEY_PREFIX = "checksums"
+LEGACY_BUCKET = ("legacy", None)
+UNKNOWN = "unknown"
+
+CHECKSUM_TTL_SECONDS = int(os.getenv("CHECKSUM_TTL_SECONDS", 400 * 24 * 3600))
+# 2**17 bits (16 KiB) por partición: ~0.2% de falsos positivos con 10.000 checksums
+BLOOM_BITS = int(os.getenv("CHECKSUM_BLOOM_BITS", 2 ** 17))
+BLOOM_HASHES = int(os.getenv("CHECKSUM_BLOOM_HASHES", 7))
+# La partición legacy recibe todo el set global anterior: 2**26 bits (8 MiB), ~0.2% con 5M checksums
+LEGACY_BLOOM_BITS = int(os.getenv("CHECKSUM_LEGACY_BLOOM_BITS", 2 ** 26))
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%Y/%m/%d', '%d/%m/%Y')
+
+
+def period_of(value):
+    """Devuelve el mes (YYYY-MM) de una fecha en cualquiera de los formatos que llegan de los bancos."""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m')
+    if isinstance(value, str) and value:
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(value[:10], date_format).strftime('%Y-%m')
+            except ValueError:
+                pass
+    return UNKNOWN
+
+
+def bucket_of(row):
+    """Partición (company_id, mes) de una fila."""
+    return (row.get('company_id') or UNKNOWN, period_of(row.get('transaction_date')))
+
+
+def set_key(bucket):
+    company_id, period = bucket
+    if bucket == LEGACY_BUCKET:
+        return f"{KEY_PREFIX}:legacy"
+    return f"{KEY_PREFIX}:{company_id}:{period}"
+
+
+def bloom_key(bucket):
+    return f"{set_key(bucket)}:bloom"
+
+
+def bloom_offsets(checksum, bits=BLOOM_BITS, hashes=BLOOM_HASHES):
+    """Posiciones del Bloom por doble hashing (Kirsch-Mitzenmacher)."""
+    digest = hashlib.blake2b(str(checksum).encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def bloom_bits(bucket):
+    return LEGACY_BLOOM_BITS if bucket == LEGACY_BUCKET else BLOOM_BITS
+
+
+def _bloom_get_args(bucket, checksum):
+    args = []
+    for offset in bloom_offsets(checksum, bits=bloom_bits(bucket)):
+        args.extend(('GET', 'u1', offset))
+    return args
+
+
+def _bloom_set_args(bucket, checksum):
+    args = []
+    for offset in bloom_offsets(checksum, bits=bloom_bits(bucket)):
+        args.extend(('SET', 'u1', offset, 1))
+    return args
+
+
+def group_by_bucket(rows):
+    """Agrupa checksums únicos por partición, conservando la primera fila de cada uno."""
+    buckets = {}
+    first_rows = {}
+    duplicates = 0
+    for row in rows:
+        checksum = row['checksum']
+        if checksum in first_rows:
+            duplicates += 1
+            continue
+        first_rows[checksum] = row
+        buckets.setdefault(bucket_of(row), []).append(checksum)
+    return buckets, first_rows, duplicates
+
+
+def find_processed(redis_client, candidates):
+    """
+    Devuelve los checksums ya procesados de ``candidates`` ({bucket: [checksum, ...]}).
+    Dos viajes a Redis: un BITFIELD por checksum contra el Bloom y un SISMEMBER
+    solo para los que el Bloom no descarta.
+    """
+    pairs = [(bucket, checksum) for bucket, checksums in candidates.items() for checksum in checksums]
+    if not pairs:
+        return set()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for bucket, checksum in pairs:
+        pipe.execute_command('BITFIELD', bloom_key(bucket), *_bloom_get_args(bucket, checksum))
+    bloom_hits = [(bucket, checksum) for (bucket, checksum), bits in zip(pairs, pipe.execute()) if all(bits)]
+    metrics.increment("checksum_bloom_negatives", len(pairs) - len(bloom_hits))
+    if not bloom_hits:
+        return set()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for bucket, checksum in bloom_hits:
+        pipe.sismember(set_key(bucket), checksum)
+    processed = {checksum for (_, checksum), found in zip(bloom_hits, pipe.execute()) if found}
+    metrics.increment("checksum_exact_lookups", len(bloom_hits))
+    metrics.increment("checksum_bloom_false_positives", len(bloom_hits) - len(processed))
+    return processed
+
+
+def filter_unseen(redis_client, rows):
+    """
+    Filtra las filas cuyo checksum no fue procesado, sin marcarlas.
+    Los checksums repetidos dentro del mismo lote se quedan con la primera fila.
+    """
+    buckets, first_rows, duplicates = group_by_bucket(rows)
+    processed = find_processed(redis_client, buckets)
+
+    if redis_client.exists(set_key(LEGACY_BUCKET)):
+        remaining = [checksum for checksums in buckets.values() for checksum in checksums if checksum not in processed]
+        processed |= find_processed(redis_client, {LEGACY_BUCKET: remaining})
+
+    metrics.increment("checksums_processed_before", len(processed))
+    metrics.increment("checksums_duplicated_in_batch", duplicates)
+    return [row for checksum, row in first_rows.items() if checksum not in processed]
+
+
+def mark_processed(redis_client, rows, ttl=CHECKSUM_TTL_SECONDS):
+    """Registra los checksums de las filas en su partición y refresca la expiración."""
+    buckets, _, _ = group_by_bucket(rows)
+    if not buckets:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for bucket, checksums in buckets.items():
+        add_to_bucket(pipe, bucket, checksums, ttl)
+    pipe.execute()
+
+
+def add_to_bucket(pipe, bucket, checksums, ttl):
+    """Encola en ``pipe`` el alta de checksums en el set y el Bloom de una partición."""
+    pipe.sadd(set_key(bucket), *checksums)
+    for checksum in checksums:
+        pipe.execute_command('BITFIELD', bloom_key(bucket), *_bloom_set_args(bucket, checksum))
+    pipe.expire(set_key(bucket), ttl)
+    pipe.expire(bloom_key(bucket), ttl)
+
+
+def migrate_legacy_set(redis_client, batch_size=5000, delete=False, ttl=CHECKSUM_TTL_SECONDS):
+    """
+    Copia el set global ``processed_checksums`` a la partición ``checksums:legacy``.
+
+    El set anterior no guarda compañía ni fecha, así que sus checksums no se pueden
+    repartir; la partición legacy se consulta como respaldo en filter_unseen hasta
+    que expire. Es idempotente y se puede relanzar.
+    """
+    total = 0
+    cursor = 0
+    while True:
+        cursor, checksums = redis_client.sscan(LEGACY_KEY, cursor=cursor, count=batch_size)
+        if checksums:
+            pipe = redis_client.pipeline(transaction=False)
+            add_to_bucket(pipe, LEGACY_BUCKET, list(checksums), ttl)
+            pipe.execute()
+            total += len(checksums)
+            logging.info(f"Checksums migrados: {total}")
+        if cursor == 0:
+            break
+    if delete:
+        redis_client.unlink(LEGACY_KEY)
+        logging.info(f"Set {LEGACY_KEY} eliminado")
+    return total
+
+
+def main():
+    import redis
+
+    parser = argparse.ArgumentParser(description="Herramientas del almacén de checksums en Redis.")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--delete", action="store_true", help=f"Elimina {LEGACY_KEY} al terminar")
+    args = parser.parse_args()
+
+    redis_client = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+    total = migrate_legacy_set(redis_client, batch_size=args.batch_size, delete=args.delete)
+    print(f"Migrados {total} checksums a {set_key(LEGACY_BUCKET)}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,255 @@
+"""
+Caché local en disco de los resultados de extracción.
+
+La clave es el diccionario de particiones (year/month/day/company_id/file_name)
+junto con la generación del objeto en GCS, así un reintento o una reejecución
+manual del mismo archivo no vuelve a lanzar la consulta a BigQuery, y una nueva
+versión del archivo (otra generación) nunca lee datos viejos.
+
+Cada entrada se guarda como un archivo Arrow IPC comprimido con zstd: formato
+columnar que se lee sin ejecutar código, a diferencia de pickle. La caché debe
+devolver exactamente los mismos valores que la consulta (etl_checksum se calcula
+con el texto de amount y reported_remaining): las columnas con un único tipo
+simple se guardan con su tipo Arrow, y el resto (Decimal, cuya escala varía
+fila a fila, datetime, o tipos mezclados como int y float) como texto con una
+etiqueta de tipo por valor. Los resultados vacíos no se cachean. El directorio
+debe ser privado del usuario del proceso (dueño y permisos 0700); si no lo es,
+la caché se desactiva en lugar de leer archivos que otro usuario pudo escribir.
+El directorio se limita por tamaño con desalojo LRU (por atime) y cada entrada
+expira por antigüedad (mtime).
+"""
+import hashlib
+import json
+import logging
+import os
+import stat
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import pyarrow as pa
+
+from src import metrics
+
+
+CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), f"etl-extraction-cache-{os.getuid()}"),
+)
+# /tmp vive en memoria en Cloud Run (1Gi compartido con redis-server)
+CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", 24 * 3600))
+SUFFIX = ".arrow"
+IPC_OPTIONS = pa.ipc.IpcWriteOptions(compression="zstd")
+
+# Tipos que Arrow devuelve idénticos cuando toda la columna es de ese tipo
+NATIVE_TYPES = (str, int, float, bool, date)
+TAGGED = {b"encoding": b"tagged"}
+_TAGS = {str: "s", int: "i", float: "f", bool: "b", Decimal: "d", date: "D", datetime: "T"}
+_UNTAG = {
+    "s": str,
+    "i": int,
+    "f": float,
+    "b": lambda text: text == "True",
+    "d": Decimal,
+    "D": date.fromisoformat,
+    "T": datetime.fromisoformat,
+}
+
+
+class UnsafeCacheDir(Exception):
+    """El directorio de caché no es un directorio privado del usuario actual."""
+
+
+def cache_key(partitions):
+    """Clave estable de las particiones; None si falta la generación del objeto."""
+    if not partitions.get('generation'):
+        return None
+    serialized = json.dumps(partitions, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def _path(key, cache_dir):
+    return os.path.join(cache_dir, key + SUFFIX)
+
+
+def ensure_private_dir(cache_dir):
+    """
+    Crea el directorio con permisos 0700 si no existe y verifica que sea un
+    directorio real (no un symlink), del usuario actual y sin acceso para otros.
+    """
+    try:
+        os.mkdir(cache_dir, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(cache_dir)
+    if not stat.S_ISDIR(info.st_mode):
+        raise UnsafeCacheDir(f"{cache_dir} no es un directorio")
+    if info.st_uid != os.getuid():
+        raise UnsafeCacheDir(f"{cache_dir} pertenece a otro usuario (uid {info.st_uid})")
+    if info.st_mode & 0o077:
+        raise UnsafeCacheDir(f"{cache_dir} tiene permisos {oct(info.st_mode & 0o777)}, se esperaba 0700")
+
+
+def _tag(value):
+    if value is None:
+        return None
+    tag = _TAGS.get(type(value))
+    if tag is None:
+        raise TypeError(f"Tipo no soportado en la caché: {type(value).__name__}")
+    if tag == "f":
+        text = repr(value)
+    elif tag in ("D", "T"):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return f"{tag}:{text}"
+
+
+def _untag(text):
+    if text is None:
+        return None
+    tag, _, value = text.partition(":")
+    return _UNTAG[tag](value)
+
+
+def encode_column(name, values):
+    """Columna Arrow nativa si conserva los valores tal cual; si no, texto etiquetado."""
+    types = {type(value) for value in values if value is not None}
+    if len(types) <= 1 and types <= set(NATIVE_TYPES):
+        try:
+            array = pa.array(values)
+            return pa.field(name, array.type), array
+        except (pa.ArrowException, OverflowError):
+            pass  # p. ej. enteros fuera de int64
+    return pa.field(name, pa.string(), metadata=TAGGED), pa.array([_tag(value) for value in values], pa.string())
+
+
+def encode_rows(rows):
+    """Convierte filas (dicts) a una tabla Arrow IPC comprimida que conserva tipo y valor."""
+    columns = []
+    seen = set()
+    for row in rows:
+        for column in row:
+            if column not in seen:
+                seen.add(column)
+                columns.append(column)
+    fields, arrays = zip(*(encode_column(column, [row.get(column) for row in rows]) for column in columns))
+    table = pa.Table.from_arrays(list(arrays), schema=pa.schema(fields))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema, options=IPC_OPTIONS) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_rows(payload):
+    """Reconstruye las filas (dicts) desde la tabla Arrow IPC."""
+    with pa.ipc.open_file(pa.BufferReader(payload)) as reader:
+        table = reader.read_all()
+    columns = []
+    for field, column in zip(table.schema, table.columns):
+        values = column.to_pylist()
+        if field.metadata == TAGGED:
+            values = [_untag(value) for value in values]
+        columns.append(values)
+    return [dict(zip(table.schema.names, values)) for values in zip(*columns)]
+
+
+def get(partitions, cache_dir=CACHE_DIR, ttl=CACHE_TTL_SECONDS):
+    """Devuelve las filas en caché o None. Registra hits y misses en las métricas."""
+    key = cache_key(partitions)
+    if key is None:
+        metrics.increment("extraction_cache_bypass")
+        return None
+    path = _path(key, cache_dir)
+    try:
+        ensure_private_dir(cache_dir)
+        info = os.stat(path)
+        if time.time() - info.st_mtime > ttl:
+            os.remove(path)
+            raise FileNotFoundError(path)
+        with open(path, 'rb') as file:
+            rows = decode_rows(file.read())
+        # LRU: atime marca el último uso, mtime la creación (TTL)
+        os.utime(path, (time.time(), info.st_mtime))
+    except FileNotFoundError:
+        metrics.increment("extraction_cache_misses")
+        return None
+    except UnsafeCacheDir as e:
+        logging.error(f"Caché de extracción desactivada: {e}")
+        metrics.increment("extraction_cache_bypass")
+        return None
+    except Exception as e:
+        logging.warning(f"Entrada de caché inválida {path}: {e}")
+        metrics.increment("extraction_cache_misses")
+        return None
+    metrics.increment("extraction_cache_hits")
+    logging.info(f"Extracción servida desde caché: {len(rows)} filas")
+    return rows
+
+
+def put(partitions, rows, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Guarda las filas extraídas y desaloja entradas si se supera el tamaño máximo."""
+    key = cache_key(partitions)
+    if key is None:
+        return
+    if not rows:
+        # Una respuesta vacía puede ser transitoria: no se sirve desde la caché
+        return
+    try:
+        payload = encode_rows(rows)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        # Tipos que la caché no sabe representar: no se cachea
+        logging.warning(f"No se pudo convertir la extracción a Arrow: {e}")
+        return
+    if len(payload) > max_bytes:
+        logging.info(f"Extracción demasiado grande para la caché: {len(payload)} bytes")
+        return
+    ensure_private_dir(cache_dir)
+    # Escritura atómica: varios workers comparten el directorio
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(payload)
+        os.replace(tmp_path, _path(key, cache_dir))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Elimina las entradas menos usadas recientemente hasta respetar ``max_bytes``."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(SUFFIX):
+            try:
+                info = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_atime, info.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            metrics.increment("extraction_cache_evictions")
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def cached(extraction, partitions):
+    """Ejecuta ``extraction(partitions)`` solo si el resultado no está en caché."""
+    rows = get(partitions)
+    if rows is not None:
+        return rows
+    rows = extraction(partitions)
+    try:
+        put(partitions, rows)
+    except (OSError, UnsafeCacheDir) as e:
+        logging.warning(f"No se pudo guardar la extracción en caché: {e}")
+    return rows
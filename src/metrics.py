@@ -0,0 +1,40 @@
+import os
+import threading
+from collections import Counter
+
+
+# Métricas en memoria por proceso (cada worker de gunicorn lleva las suyas)
+_lock = threading.Lock()
+_counters = Counter()
+_gauges = {}
+
+
+def increment(name, value=1):
+    """Incrementa un contador."""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name, value):
+    """Fija el valor actual de un indicador (p. ej. trabajo en vuelo)."""
+    with _lock:
+        _gauges[name] = value
+
+
+def get(name):
+    """Devuelve el valor actual de un contador."""
+    with _lock:
+        return _counters[name]
+
+
+def snapshot():
+    """Devuelve una copia de las métricas del proceso actual."""
+    with _lock:
+        return {"pid": os.getpid(), "counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def reset():
+    """Reinicia todas las métricas (útil en benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
@@ -1,6 +1,6 @@
 from google.cloud import pubsub_v1
+from src.serialization import dumps, compress
 import logging
-import json
 
 
 logging.basicConfig(level=logging.INFO)
@@ -12,12 +12,33 @@ publisher_options = pubsub_v1.types.BatchSettings(
 )
 publisher = pubsub_v1.PublisherClient(batch_settings=publisher_options)
 
+class PublishError(Exception):
+    """Some messages of a batch could not be published."""
+
+
 def publish_response(message, topic):
     """Publishes processed message to Pub/Sub topic."""
-    message_bytes = json.dumps(message).encode("utf-8")
-    topic_path = publisher.topic_path("production-400914", topic)
+    message_bytes, attributes = compress(dumps(message))
     try:
-        publish_future = publisher.publish(topic_path, data=message_bytes)
+        publish_future = publish_bytes(message_bytes, topic, **attributes)
         logging.info(f"Published message with ID: {publish_future.result()}")
     except Exception as e:
-        logging.error(f"Failed to publish message: {e}")
\ No newline at end of file
+        logging.error(f"Failed to publish message: {e}")
+
+def publish_bytes(message_bytes, topic, **attributes):
+    """Publishes an already serialized message to Pub/Sub topic and returns its future."""
+    topic_path = publisher.topic_path("production-400914", topic)
+    return publisher.publish(topic_path, data=message_bytes, **attributes)
+
+def wait_for_publish(futures, timeout=None):
+    """Waits for every publish future and raises PublishError if any of them failed."""
+    failures = 0
+    for publish_future in futures:
+        try:
+            publish_future.result(timeout=timeout)
+        except Exception as e:
+            failures += 1
+            logging.error(f"Failed to publish message: {e}")
+    if failures:
+        raise PublishError(f"{failures} of {len(futures)} messages failed to publish")
+    logging.info(f"Published {len(futures)} messages")
\ No newline at end of file
@@ -1,8 +1,11 @@
 import logging
+import os
 import sys
 
 
 LOCK_EXPIRY_SECONDS = 5
+# Tiempo que se recuerda un archivo ya procesado (7 días por defecto)
+FILE_FINGERPRINT_TTL_SECONDS = int(os.getenv("FILE_FINGERPRINT_TTL_SECONDS", 7 * 24 * 3600))
 
 logging.basicConfig(
     stream=sys.stdout,
@@ -23,32 +26,37 @@ def release_lock(redis_client, key):
     lock_key = f"lock:{key}"
     redis_client.delete(lock_key)
 
-def store_checksum_atomic(redis_client, checksum):
-    """Guarda un checksum en Redis con exclusión mutua."""
-    lock_key = f"checksum:{checksum}"
-    if acquire_lock(redis_client, lock_key):
-        try:
-            redis_client.sadd("processed_checksums", checksum)
-            logging.info(f"Checksum almacenado: {checksum}")
-        finally:
-            release_lock(redis_client, lock_key)
-    else:
-        logging.warning(f"No se pudo adquirir lock para checksum: {checksum}")
-
-def is_checksum_processed_atomic(redis_client, checksum):
-    """Verifica si un checksum ya fue procesado."""
-    return redis_client.sismember("processed_checksums", checksum)
-
-def filter_unique_transactions(redis_client, rows_to_process):
-    """Filtra las transacciones únicas utilizando Redis."""
-    unique_rows = []
-    for row in rows_to_process:
-        checksum = row['checksum']
-        if not is_checksum_processed_atomic(redis_client, checksum):
-            unique_rows.append(row)
-            store_checksum_atomic(redis_client, checksum)
-        else:
-            logging.info(f"Checksum ya procesado: {checksum}")
-
-    logging.info(f"Transacciones únicas a procesar: {len(unique_rows)}")
-    return unique_rows
\ No newline at end of file
+def file_fingerprint_keys(event_data):
+    """
+    Claves de idempotencia de un archivo de GCS a partir del evento de Pub/Sub:
+    una por bucket/nombre/generación y otra por contenido (md5Hash + size).
+    """
+    bucket_name = event_data.get("bucket")
+    file_path = event_data.get("name")
+    keys = []
+    generation = event_data.get("generation")
+    if generation:
+        keys.append(f"file:generation:{bucket_name}/{file_path}#{generation}")
+    md5_hash = event_data.get("md5Hash")
+    if md5_hash:
+        keys.append(f"file:md5:{bucket_name}:{md5_hash}:{event_data.get('size', '')}")
+    return keys
+
+def is_file_processed(redis_client, event_data):
+    """Verifica si el archivo (misma generación o mismo contenido) ya fue procesado."""
+    keys = file_fingerprint_keys(event_data)
+    if not keys:
+        return False
+    return redis_client.exists(*keys) > 0
+
+def mark_file_processed(redis_client, event_data, ttl=FILE_FINGERPRINT_TTL_SECONDS):
+    """Registra el archivo como procesado con expiración."""
+    keys = file_fingerprint_keys(event_data)
+    if not keys:
+        return
+    source = f"gs://{event_data.get('bucket')}/{event_data.get('name')}#{event_data.get('generation')}"
+    pipe = redis_client.pipeline()
+    for key in keys:
+        pipe.set(key, source, ex=ttl)
+    pipe.execute()
+    logging.info(f"Archivo registrado como procesado: {source}")
@@ -0,0 +1,115 @@
+"""
+Registro en Redis de los archivos omitidos por el presupuesto de BigQuery.
+
+Cuando una consulta supera ``max_bytes_per_query`` con la política 'refuse', el
+endpoint responde 2xx para que Pub/Sub no reenvíe el evento indefinidamente; el
+evento original se guarda en ``refused:{bucket}/{nombre}#{generación}`` (JSON con
+el payload, el motivo y los bytes estimados) con expiración REFUSED_FILE_TTL_SECONDS,
+para listarlo y reprocesarlo tras revisar el presupuesto.
+
+Uso:
+    python -m src.refused_files list [--host localhost --port 6379]
+    python -m src.refused_files replay <bucket/nombre#generación>
+    python -m src.refused_files delete <bucket/nombre#generación>
+"""
+import argparse
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+from src.checkpoints import file_id
+
+
+KEY_PREFIX = "refused"
+REFUSED_FILE_TTL_SECONDS = int(os.getenv("REFUSED_FILE_TTL_SECONDS", 30 * 24 * 3600))
+
+
+def refused_key(file_key):
+    return f"{KEY_PREFIX}:{file_key}"
+
+
+def record(redis_client, event_data, error, ttl=REFUSED_FILE_TTL_SECONDS):
+    """Guarda el evento omitido junto con el motivo; devuelve la clave usada."""
+    key = refused_key(file_id(event_data))
+    previous = get(redis_client, file_id(event_data))
+    entry = {
+        "event": event_data,
+        "reason": str(error),
+        "stage": getattr(error, "stage", None),
+        "query": getattr(error, "label", None),
+        "estimated_bytes": getattr(error, "estimated_bytes", None),
+        "max_bytes": getattr(error, "max_bytes", None),
+        "refused_at": datetime.now(timezone.utc).isoformat(),
+        "attempts": (previous or {}).get("attempts", 0) + 1,
+    }
+    redis_client.set(key, json.dumps(entry), ex=ttl)
+    return key
+
+
+def get(redis_client, file_key):
+    """Devuelve la entrada de un archivo omitido o None."""
+    value = redis_client.get(refused_key(file_key))
+    return json.loads(value) if value else None
+
+
+def list_entries(redis_client):
+    """Entradas de todos los archivos omitidos, de la más antigua a la más reciente."""
+    entries = []
+    for key in redis_client.scan_iter(match=f"{KEY_PREFIX}:*", count=500):
+        value = redis_client.get(key)
+        if value:
+            entries.append(json.loads(value))
+    return sorted(entries, key=lambda entry: entry["refused_at"])
+
+
+def remove(redis_client, file_key):
+    return redis_client.delete(refused_key(file_key))
+
+
+def replay(redis_client, file_key, handle_event):
+    """
+    Vuelve a procesar un archivo omitido con ``handle_event(event, bucket, name)``
+    (main.handle_event) y elimina la entrada si termina sin error.
+    """
+    entry = get(redis_client, file_key)
+    if entry is None:
+        raise KeyError(file_key)
+    event_data = entry["event"]
+    result = handle_event(event_data, event_data.get("bucket"), event_data.get("name"))
+    remove(redis_client, file_key)
+    logging.info(f"Archivo reprocesado: {file_key}")
+    return result
+
+
+def main():
+    import redis
+
+    parser = argparse.ArgumentParser(description="Archivos omitidos por el presupuesto de BigQuery.")
+    parser.add_argument("command", choices=["list", "replay", "delete"])
+    parser.add_argument("file", nargs="?", help="bucket/nombre#generación (replay, delete)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    redis_client = redis.Redis(host=args.host, port=args.port, decode_responses=True)
+    if args.command == "list":
+        for entry in list_entries(redis_client):
+            print(f"{file_id(entry['event'])}\t{entry['refused_at']}\t{entry['stage']}/{entry['query']}\t"
+                  f"{entry['estimated_bytes']} > {entry['max_bytes']} bytes\t{entry['attempts']} intento(s)")
+        return
+    if not args.file:
+        parser.error(f"{args.command} requiere el archivo (bucket/nombre#generación)")
+    if args.command == "delete":
+        print("Eliminado" if remove(redis_client, args.file) else "No encontrado")
+        return
+
+    # Usa la configuración actual (config/transactions.yaml): revisar el presupuesto antes de reprocesar
+    import main as app
+
+    app.redis_client = redis_client
+    print(replay(redis_client, args.file, app.handle_event))
+
+
+if __name__ == "__main__":
+    main()
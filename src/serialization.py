@@ -0,0 +1,86 @@
+import datetime
+import decimal
+import gzip
+import json
+import logging
+import os
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, stdlib json is always available
+    orjson = None
+
+
+# "json" forces the stdlib encoder, whose output is byte-for-byte the legacy json.dumps payload.
+# The two encoders produce the same document except for non-finite floats: the stdlib encoder
+# keeps the legacy NaN/Infinity tokens (not valid JSON), orjson writes null. Non-ASCII text is
+# \u-escaped by the stdlib encoder and raw UTF-8 with orjson; both decode to the same string.
+JSON_ENCODER = os.getenv("PUBSUB_JSON_ENCODER", "orjson" if orjson else "json")
+# Payloads of at least this many bytes are gzipped; 0 disables compression.
+COMPRESSION_MIN_BYTES = int(os.getenv("PUBSUB_COMPRESSION_MIN_BYTES", "0"))
+COMPRESSION_LEVEL = int(os.getenv("PUBSUB_COMPRESSION_LEVEL", "6"))
+
+
+def json_default(value):
+    """Serializa los tipos que json no soporta de forma nativa (fechas y Decimal)."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        # Texto para no perder precisión en importes
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Reused encoder: json.dumps(default=...) would build a new JSONEncoder on every call
+_json_encoder = json.JSONEncoder(default=json_default)
+
+
+def dumps(message, encoder=None):
+    """
+    Serializes a message to JSON bytes.
+
+    Uses orjson when installed, falling back to stdlib json otherwise or when orjson
+    rejects the payload (e.g. non-string keys). Both produce the same JSON document,
+    except that NaN and Infinity become null with orjson (the default), while the
+    stdlib encoder reproduces the legacy ``json.dumps`` bytes exactly, NaN included.
+
+    Parameters:
+        message: The JSON-compatible object to serialize.
+        encoder (str): "orjson" or "json"; defaults to PUBSUB_JSON_ENCODER.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document.
+    """
+    encoder = encoder or JSON_ENCODER
+    if encoder == "orjson" and orjson is not None:
+        try:
+            return orjson.dumps(message, default=json_default)
+        except TypeError as e:  # orjson.JSONEncodeError subclasses TypeError
+            logging.debug(f"orjson could not encode message, using json: {e}")
+    return _json_encoder.encode(message).encode("utf-8")
+
+
+def compress(data, min_bytes=None, level=None):
+    """
+    Gzips a payload when it reaches the configured size.
+
+    Parameters:
+        data (bytes): The serialized payload.
+        min_bytes (int): Size threshold; defaults to PUBSUB_COMPRESSION_MIN_BYTES (0 disables).
+        level (int): gzip compression level; defaults to PUBSUB_COMPRESSION_LEVEL.
+
+    Returns:
+        tuple: The (possibly compressed) payload and the message attributes describing it.
+    """
+    min_bytes = COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    if not min_bytes or len(data) < min_bytes:
+        return data, {}
+    level = COMPRESSION_LEVEL if level is None else level
+    return gzip.compress(data, compresslevel=level, mtime=0), {"content_encoding": "gzip"}
+
+
+def decompress(data, attributes):
+    """Revierte compress() a partir de los atributos del mensaje."""
+    if (attributes or {}).get("content_encoding") == "gzip":
+        return gzip.decompress(data)
+    return data
@@ -0,0 +1,200 @@
+"""
+Checks for the admission controller of the events endpoint (src.admission).
+
+Drives AdmissionController.admit directly on an asyncio loop with tiny limits and
+covers: 503 once the small-file budget is exhausted (a single file bigger than
+the budget is still admitted when nothing else is in flight), 429 when the
+large-file queue is full, 503 when a large file times out in the queue, and the
+in-flight/running/waiting gauges, the large-file slot and the counters after
+blocks that succeed, raise, or are cancelled while queued.
+
+Usage:
+    PYTHONPATH=. python test/admission_control.py
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+
+UNIT = 1024
+
+
+def event(units):
+    return {"bucket": "bucket", "name": f"statement-{units}.avro", "size": str(units * UNIT)}
+
+
+def gauges(modules):
+    snapshot = modules.metrics.snapshot()["gauges"]
+    return {name: snapshot.get(name) for name in ("admission_in_flight", "admission_large_running", "admission_large_waiting")}
+
+
+def assert_idle(controller, modules):
+    assert (controller.in_flight, controller.large_running, controller.large_waiting) == (0, 0, 0), \
+        (controller.in_flight, controller.large_running, controller.large_waiting)
+    published = gauges(modules)
+    assert all(value in (None, 0) for value in published.values()), f"gauges not released: {published}"
+    assert not controller._large_slots.locked(), "large-file slot not released"
+
+
+def controller_for(modules, **kwargs):
+    modules.metrics.reset()
+    options = dict(budget=4, unit_bytes=UNIT, large_file_bytes=100 * UNIT, large_concurrency=1,
+                   large_queue_size=1, queue_timeout=1, retry_after=10)
+    options.update(kwargs)
+    return modules.AdmissionController(**options)
+
+
+async def rejection(controller, event_data):
+    """Intenta admitir el evento y devuelve el AdmissionRejected (o None si entró)."""
+    from src.admission import AdmissionRejected
+
+    try:
+        async with controller.admit(event_data):
+            return None
+    except AdmissionRejected as e:
+        return e
+
+
+async def scenario_budget_exhausted(modules):
+    """503 con Retry-After cuando el presupuesto de archivos chicos se agota."""
+    controller = controller_for(modules)
+    async with controller.admit(event(3)):
+        assert gauges(modules)["admission_in_flight"] == 3, gauges(modules)
+        rejected = await rejection(controller, event(2))
+        assert rejected is not None, "event over the budget was admitted"
+        assert rejected.status_code == 503, rejected.status_code
+        assert rejected.retry_after >= controller.retry_after, rejected.retry_after
+        assert modules.metrics.get("admission_rejected_503") == 1
+        assert await rejection(controller, event(1)) is None, "event that fits the budget was rejected"
+        assert controller.in_flight == 3, "rejected event changed in_flight"
+    assert_idle(controller, modules)
+    # Sin nada en vuelo, un archivo más grande que el presupuesto se admite igual
+    assert await rejection(controller, event(10)) is None, "lone oversized small file was rejected"
+    assert modules.metrics.get("admission_admitted") == 3, modules.metrics.get("admission_admitted")
+    assert_idle(controller, modules)
+    return "503 over budget, released after the block"
+
+
+async def scenario_large_queue_full(modules):
+    """429 cuando los archivos grandes en curso y en cola llenan el carril."""
+    controller = controller_for(modules)
+    running = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def hold():
+        async with controller.admit(event(100)):
+            running.set()
+            await finish.wait()
+
+    first = asyncio.create_task(hold())
+    await running.wait()
+    queued = asyncio.create_task(rejection(controller, event(200)))
+    await asyncio.sleep(0)
+    assert controller.large_waiting == 1 and gauges(modules)["admission_large_waiting"] == 1, gauges(modules)
+
+    rejected = await rejection(controller, event(300))
+    assert rejected is not None and rejected.status_code == 429, rejected
+    assert modules.metrics.get("admission_rejected_429") == 1
+    # Los archivos chicos tienen su propio presupuesto
+    assert await rejection(controller, event(1)) is None, "small file blocked by the large-file lane"
+
+    finish.set()
+    await first
+    assert await queued is None, "queued large file was not admitted after the slot freed"
+    assert modules.metrics.get("admission_admitted_large") == 2
+    assert_idle(controller, modules)
+    return "429 with a full queue, queued file admitted once the slot freed"
+
+
+async def scenario_queue_timeout(modules):
+    """503 cuando un archivo grande no consigue turno dentro de queue_timeout."""
+    controller = controller_for(modules, large_queue_size=2, queue_timeout=0.05)
+    running = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def hold():
+        async with controller.admit(event(100)):
+            running.set()
+            await finish.wait()
+
+    first = asyncio.create_task(hold())
+    await running.wait()
+    rejected = await rejection(controller, event(200))
+    assert rejected is not None and rejected.status_code == 503, rejected
+    assert modules.metrics.get("admission_rejected_503") == 1
+    assert controller.large_waiting == 0, "timed-out event still counted as waiting"
+    assert gauges(modules)["admission_large_waiting"] == 0, f"waiting gauge not released: {gauges(modules)}"
+
+    finish.set()
+    await first
+    assert_idle(controller, modules)
+    return "503 after the queue timeout, waiting gauge released"
+
+
+async def scenario_released_on_error(modules):
+    """Presupuesto, turno y gauges se liberan si el bloque falla o se cancela en la cola."""
+    controller = controller_for(modules)
+    for size in (3, 100):
+        try:
+            async with controller.admit(event(size)):
+                raise RuntimeError("handler failed")
+        except RuntimeError:
+            pass
+        assert_idle(controller, modules)
+
+    running = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def hold():
+        async with controller.admit(event(100)):
+            running.set()
+            await finish.wait()
+
+    first = asyncio.create_task(hold())
+    await running.wait()
+    queued = asyncio.create_task(rejection(controller, event(200)))
+    await asyncio.sleep(0)
+    queued.cancel()
+    try:
+        await queued
+    except asyncio.CancelledError:
+        pass
+    assert controller.large_waiting == 0 and gauges(modules)["admission_large_waiting"] == 0, \
+        f"cancelled event still waiting: {gauges(modules)}"
+    finish.set()
+    await first
+    assert_idle(controller, modules)
+    assert await rejection(controller, event(100)) is None, "large-file slot leaked"
+    assert modules.metrics.get("admission_admitted") == 1 and modules.metrics.get("admission_admitted_large") == 3
+    return "released after exceptions and a cancelled wait"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    from src import metrics
+    from src.admission import AdmissionController
+
+    modules = argparse.Namespace(metrics=metrics, AdmissionController=AdmissionController)
+    scenarios = (scenario_budget_exhausted, scenario_large_queue_full, scenario_queue_timeout,
+                 scenario_released_on_error)
+
+    failed = 0
+    for scenario in scenarios:
+        try:
+            detail = asyncio.run(scenario(modules))
+            print(f"PASS {scenario.__name__}: {detail}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {scenario.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Memory and lookup benchmark for src.checksum_store against the legacy global set.
+
+Needs a Redis server (the container starts one); uses a dedicated database that
+is FLUSHED at start, so never point it at production data.
+
+Usage:
+    PYTHONPATH=. python test/bench_checksum_store.py --checksums 1000000 --db 15
+"""
+import argparse
+import hashlib
+import random
+import time
+
+import redis
+
+from src import checksum_store
+
+
+def make_rows(n, companies, months):
+    rng = random.Random(7)
+    company_ids = [f"company-{i}" for i in range(companies)]
+    for i in range(n):
+        yield {
+            'checksum': hashlib.md5(str(i).encode()).hexdigest(),
+            'company_id': rng.choice(company_ids),
+            'transaction_date': f"2024-{rng.randrange(months) % 12 + 1:02d}-{rng.randrange(1, 29):02d}",
+        }
+
+
+def chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def memory_of(redis_client, pattern):
+    total = 0
+    for key in redis_client.scan_iter(match=pattern, count=1000):
+        total += redis_client.memory_usage(key, samples=0) or 0
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--checksums", type=int, default=1000000)
+    parser.add_argument("--companies", type=int, default=50)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--batch", type=int, default=5000, help="Filas por archivo simulado")
+    args = parser.parse_args()
+
+    redis_client = redis.Redis(host=args.host, port=args.port, db=args.db, decode_responses=True)
+    redis_client.flushdb()
+    per_million = 1000000 / args.checksums
+
+    # Legacy: un único set global
+    start = time.perf_counter()
+    for batch in chunks(make_rows(args.checksums, args.companies, args.months), args.batch):
+        redis_client.sadd(checksum_store.LEGACY_KEY, *(row['checksum'] for row in batch))
+    legacy_seconds = time.perf_counter() - start
+    legacy_bytes = memory_of(redis_client, checksum_store.LEGACY_KEY)
+
+    # Particionado por compañía y mes, con Bloom
+    start = time.perf_counter()
+    for batch in chunks(make_rows(args.checksums, args.companies, args.months), args.batch):
+        checksum_store.mark_processed(redis_client, batch)
+    store_seconds = time.perf_counter() - start
+    set_bytes = sum(
+        redis_client.memory_usage(key, samples=0) or 0
+        for key in redis_client.scan_iter(match=f"{checksum_store.KEY_PREFIX}:*", count=1000)
+        if not key.endswith(":bloom")
+    )
+    bloom_bytes = memory_of(redis_client, f"{checksum_store.KEY_PREFIX}:*:bloom")
+
+    print(f"checksums: {args.checksums}  companies: {args.companies}  months: {args.months}")
+    print(f"legacy set:        {legacy_bytes * per_million / 1024 / 1024:8.1f} MiB per million  (load {legacy_seconds:.1f}s)")
+    print(f"sharded sets:      {set_bytes * per_million / 1024 / 1024:8.1f} MiB per million")
+    print(f"bloom prefilters:  {bloom_bytes * per_million / 1024 / 1024:8.1f} MiB per million  (load {store_seconds:.1f}s)")
+
+    # Lookups: un archivo de filas nuevas (caso habitual) y uno ya procesado
+    new_rows = [dict(row, checksum=f"new-{row['checksum']}") for row in make_rows(args.batch, args.companies, args.months)]
+    seen_rows = list(make_rows(args.batch, args.companies, args.months))
+    for label, rows in (("new file", new_rows), ("reprocessed file", seen_rows)):
+        start = time.perf_counter()
+        pipe = redis_client.pipeline(transaction=False)
+        for row in rows:
+            pipe.sismember(checksum_store.LEGACY_KEY, row['checksum'])
+        pipe.execute()
+        legacy_lookup = time.perf_counter() - start
+        start = time.perf_counter()
+        unseen = checksum_store.filter_unseen(redis_client, rows)
+        store_lookup = time.perf_counter() - start
+        print(
+            f"{label:>17}: legacy pipelined SISMEMBER {legacy_lookup * 1000:7.1f} ms  "
+            f"sharded+bloom {store_lookup * 1000:7.1f} ms  unseen {len(unseen)}/{len(rows)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+"""
+Offline end-to-end benchmark of theetl.etl.ETL with local stand-ins.
+
+Generates synthetic bank statements (rows, metadata fan-out, duplicate ratio and
+mixed date formats), then runs main.handle_event for every file and times each
+stage it calls: extraction, transformations, filters, the Redis dedup, loads and
+the commit (checksums, checkpoint and processed-file registry). BigQuery and Pub/Sub are replaced with in-memory
+fakes; Redis is fakeredis or a real server given with --redis-url (its database
+is FLUSHED). Reports rows/s, p50/p99 latency per file and the memory growth of each
+stage (how far its peak rises above the memory in use when it starts), and writes
+JSON results that can be compared between runs. On Linux the peak is the process
+RSS high-water mark, reset before every stage through /proc/self/clear_refs;
+elsewhere it is the tracemalloc peak (Python allocations only, and tracing slows
+the stages down).
+
+Usage:
+    PYTHONPATH=. python test/bench_pipeline.py --files 20 --rows 2000 --output bench.json
+    PYTHONPATH=. python test/bench_pipeline.py --files 20 --rows 2000 --compare bench.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from unittest import mock
+
+
+BUCKET = "ingesta-pruebas-cofers-domingo"
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%Y/%m/%d', '%d-%m-%Y')
+STAGES = ("extraction", "transformations", "filters", "redis_dedup", "loads", "commit")
+
+
+# --- Synthetic data -------------------------------------------------------------
+
+def generate_statement(seed, rows, fanout, duplicate_ratio, company_id, mixed_dates=True):
+    """
+    Genera las filas crudas de un archivo tal como las devuelve query_raw_transactions
+    (una fila por transacción y entrada de metadata) y los checksums que ya existen
+    en el histórico según ``duplicate_ratio``.
+    """
+    rng = random.Random(seed)
+    account = rng.randrange(10 ** 9)
+    bank = rng.choice(["BBVA", "SANTANDER", "BANORTE", "HSBC"])
+    currency = rng.choice(["MXN", "USD"])
+    report_date = date(2024, 11, 1) + timedelta(days=seed % 28)
+    raw_rows = []
+    history = []
+    remaining = rng.uniform(10 ** 4, 10 ** 6)
+    for i in range(rows):
+        checksum = hashlib.md5(f"{seed}:{i}".encode()).hexdigest()
+        if rng.random() < duplicate_ratio:
+            history.append(checksum)
+        transaction_date = report_date - timedelta(days=rng.randrange(30))
+        date_format = rng.choice(DATE_FORMATS) if mixed_dates else DATE_FORMATS[0]
+        amount = round(rng.uniform(-5000, 5000), 2)
+        remaining += amount
+        base = {
+            'checksum': checksum,
+            'transaction_date': transaction_date.strftime(date_format),
+            'concept': f"SPEI REF {rng.randrange(10 ** 7)} {rng.choice(['PAGO', 'COBRO', 'COMISION'])}",
+            'amount': amount,
+            'reported_remaining': round(remaining, 2),
+            'account_number': str(account),
+            'account_alias': f"cuenta-{account % 100}",
+            'currency': currency,
+            'report_type': "daily",
+            'created_at': report_date.strftime(rng.choice(('%Y-%m-%d', '%d/%m/%Y')) if mixed_dates else '%Y-%m-%d'),
+            'bank': bank,
+            'extraction_date': f"{report_date.isoformat()}T06:00:00",
+            'user_id': f"user-{seed % 7}",
+            'company_id': company_id,
+        }
+        for m in range(max(fanout, 1)):
+            raw_rows.append(dict(base, metadata_key=f"key{m}" if fanout else None, metadata_value=f"value{i}-{m}" if fanout else None))
+    return raw_rows, history
+
+
+def event_for(seed, company_id):
+    report_date = date(2024, 11, 1) + timedelta(days=seed % 28)
+    name = (f"year={report_date.year}/month={report_date.month}/day={report_date.day}/"
+            f"company_id={company_id}/statement-{seed}.avro")
+    return {"bucket": BUCKET, "name": name, "generation": str(1700000000000000 + seed),
+            "md5Hash": hashlib.md5(name.encode()).hexdigest(), "size": "0"}
+
+
+# --- Stand-ins --------------------------------------------------------------------
+
+class FakeQueryJob:
+    def __init__(self, rows, total_bytes_processed=None):
+        self.rows = rows
+        self.total_bytes_processed = total_bytes_processed
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def result(self):
+        return self.rows
+
+
+class FakeBigQueryClient:
+    """
+    Responde la consulta de extracción por _FILE_NAME y las de checksums por compañía.
+    Los dry runs devuelven ``bytes_per_row`` por cada fila que leería la consulta.
+    """
+
+    file_pattern = re.compile(r"_FILE_NAME = 'gs://[^/]+/([^']+)'")
+    checksum_pattern = re.compile(r"SELECT\s+(checksum|etl_checksum)\s+FROM", re.IGNORECASE)
+
+    def __init__(self, bytes_per_row=256):
+        self.files = {}
+        self.history = {}
+        self.queries = 0
+        self.dry_runs = 0
+        self.bytes_per_row = bytes_per_row
+
+    def query(self, query, job_config=None):
+        match = self.file_pattern.search(query)
+        if match:
+            rows = self.files.get(match.group(1), [])
+        else:
+            match = self.checksum_pattern.search(query)
+            if not match:
+                raise ValueError(f"Unexpected query: {query[:200]}")
+            field = match.group(1)
+            rows = [{field: checksum} for checksum in self.history.get(field, [])]
+        if getattr(job_config, "dry_run", False):
+            self.dry_runs += 1
+            return FakeQueryJob([], total_bytes_processed=len(rows) * self.bytes_per_row)
+        self.queries += 1
+        return FakeQueryJob(rows)
+
+
+class FakeFuture:
+    def __init__(self, message_id, error=None):
+        self.message_id = message_id
+        self.error = error
+
+    def result(self, timeout=None):
+        if self.error:
+            raise self.error
+        return self.message_id
+
+
+class FakePublisher:
+    """
+    Publisher en memoria. ``fail_when(n, data)`` permite inyectar fallos por mensaje
+    y ``record=True`` guarda los payloads publicados con éxito.
+    """
+
+    def __init__(self, record=False):
+        self.messages = 0
+        self.bytes = 0
+        self.failed = 0
+        self.record = record
+        self.published = []
+        self.fail_when = None
+
+    def topic_path(self, project, topic):
+        return f"projects/{project}/topics/{topic}"
+
+    def publish(self, topic_path, data, **attributes):
+        if self.fail_when and self.fail_when(self.messages + self.failed, data):
+            self.failed += 1
+            return FakeFuture(None, error=RuntimeError("injected publish failure"))
+        self.messages += 1
+        self.bytes += len(data)
+        if self.record:
+            self.published.append(data)
+        return FakeFuture(str(self.messages))
+
+
+def redis_stand_in(redis_url):
+    if redis_url:
+        import redis
+        client = redis.Redis.from_url(redis_url, decode_responses=True)
+        client.flushdb()
+        return client
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed; install it or pass --redis-url redis://localhost:6379/15")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+# --- Measurement ----------------------------------------------------------------
+
+def reset_rss_peak():
+    """Reinicia el máximo de RSS del proceso (VmHWM); False si el sistema no lo permite."""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def proc_status_mb(field):
+    with open("/proc/self/status") as file:
+        return int(re.search(rf"{field}:\s+(\d+) kB", file.read()).group(1)) / 1024
+
+
+class StageMemory:
+    """
+    Pico de memoria de cada etapa. ru_maxrss solo crece durante todo el proceso, así
+    que no sirve por etapa: se reinicia VmHWM antes de la etapa y se lee al terminar,
+    o se usa el pico de tracemalloc si /proc no está disponible. Por etapa se reporta
+    ``growth_mb``, lo que el pico supera a la memoria al empezar la etapa: el RSS
+    absoluto no baja al liberar memoria y sería el mismo en todas las etapas.
+    """
+
+    def __init__(self):
+        self.method = "rss" if reset_rss_peak() else "tracemalloc"
+        if self.method == "tracemalloc":
+            tracemalloc.start()
+
+    def start(self):
+        if self.method == "rss":
+            reset_rss_peak()
+            self.start_mb = proc_status_mb("VmRSS")
+        else:
+            tracemalloc.reset_peak()
+            self.start_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+
+    def peak_mb(self):
+        if self.method == "rss":
+            return proc_status_mb("VmHWM")
+        return tracemalloc.get_traced_memory()[1] / 1024 / 1024
+
+
+# Filas (entrada, salida) de cada llamada medida, a partir de sus argumentos y resultado
+def rows_filtered(args, out):
+    return len(args[0]), len(out)
+
+
+def rows_extracted(args, out):
+    return len(out), len(out)
+
+
+def rows_loaded(args, out):
+    return len(args[0]), len(args[0])
+
+
+def rows_in_redis(args, out):
+    return len(args[1]), len(out)
+
+
+def rows_committed(args, out):
+    return len(args[1]), len(args[1])
+
+
+def no_rows(args, out):
+    return 0, 0
+
+
+class StageRecorder:
+    """
+    Muestras por archivo de cada etapa de main.handle_event. ``wrap`` envuelve una
+    función que el flujo llama; si una etapa la forman varias llamadas (commit) se
+    suman sus tiempos y filas y se toma el mayor crecimiento de memoria.
+    """
+
+    def __init__(self, memory):
+        self.memory = memory
+        self.samples = {stage: [] for stage in STAGES}
+        self.current = {}
+
+    def wrap(self, stage, func, count=None):
+        count = count or rows_filtered
+
+        def timed(*args, **kwargs):
+            self.memory.start()
+            start = time.perf_counter()
+            out = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            peak_mb = self.memory.peak_mb()
+            rows_in, rows_out = count(args, out)
+            sample = self.current.setdefault(
+                stage, {"seconds": 0.0, "rows_in": 0, "rows_out": 0, "peak_mb": 0.0, "growth_mb": 0.0})
+            sample["seconds"] += seconds
+            sample["rows_in"] += rows_in
+            sample["rows_out"] += rows_out
+            sample["peak_mb"] = max(sample["peak_mb"], peak_mb)
+            sample["growth_mb"] = max(sample["growth_mb"], peak_mb - self.memory.start_mb)
+            return out
+        return timed
+
+    def finish_file(self):
+        for stage, sample in self.current.items():
+            self.samples[stage].append(sample)
+        self.current = {}
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+def summarize(samples):
+    stages = {}
+    for stage in STAGES:
+        runs = samples[stage]
+        seconds = [run["seconds"] for run in runs]
+        rows_in = sum(run["rows_in"] for run in runs)
+        total = sum(seconds)
+        stages[stage] = {
+            "rows_in": rows_in,
+            "rows_out": sum(run["rows_out"] for run in runs),
+            "rows_per_second": rows_in / total if total else 0.0,
+            "p50_ms": percentile(seconds, 50) * 1000,
+            "p99_ms": percentile(seconds, 99) * 1000,
+            "growth_mb": max(run["growth_mb"] for run in runs),
+        }
+    return stages
+
+
+def run_benchmark(args):
+    os.environ.setdefault("GCP_PROJECT", "bench")
+    os.environ.setdefault("DATASET_NAME", "bench")
+    os.environ.setdefault("TABLE_NAME", "transactions")
+    os.environ.setdefault("TOPIC_IN", "bench-transactions")
+    # Caché de extracción aislada por ejecución para no reutilizar resultados de otra corrida
+    os.environ["EXTRACTION_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-extraction-cache-")
+
+    bq_client = FakeBigQueryClient()
+    publisher = FakePublisher()
+    redis_client = redis_stand_in(args.redis_url)
+
+    # Los módulos del pipeline crean sus clientes al importarse o en cada llamada.
+    with mock.patch("google.cloud.bigquery.Client", return_value=bq_client), \
+            mock.patch("google.cloud.pubsub_v1.PublisherClient", return_value=publisher):
+        import main as app
+        from etl.filters import checksum_bigquery
+        from src import metrics, pubsub
+
+        checksum_bigquery.client = bq_client
+        pubsub.publisher = publisher
+        app.redis_client = redis_client
+        etl = app.ETL(args.config, args.name)
+
+        # Se corre main.handle_event tal cual; cada etapa se mide envolviendo lo que llama
+        memory = StageMemory()
+        recorder = StageRecorder(memory)
+        etl.run_extraction = recorder.wrap("extraction", etl.run_extraction, rows_extracted)
+        etl.run_transformations = recorder.wrap("transformations", etl.run_transformations)
+        etl.run_filters = recorder.wrap("filters", etl.run_filters)
+        etl.run_loads = recorder.wrap("loads", etl.run_loads, rows_loaded)
+
+        Checkpoint = app.Checkpoint
+
+        def checkpoint_for(*checkpoint_args, **kwargs):
+            checkpoint = Checkpoint(*checkpoint_args, **kwargs)
+            checkpoint.clear = recorder.wrap("commit", checkpoint.clear, no_rows)
+            return checkpoint
+
+        companies = [f"company-{i}" for i in range(args.companies)]
+        with mock.patch.object(app, "ETL", lambda *_: etl), \
+                mock.patch.object(app, "Checkpoint", checkpoint_for), \
+                mock.patch.object(app, "filter_unseen", recorder.wrap("redis_dedup", app.filter_unseen, rows_in_redis)), \
+                mock.patch.object(app, "mark_processed", recorder.wrap("commit", app.mark_processed, rows_committed)), \
+                mock.patch.object(app, "mark_file_processed", recorder.wrap("commit", app.mark_file_processed, no_rows)):
+            wall_start = time.perf_counter()
+            for seed in range(args.files):
+                company_id = companies[seed % len(companies)]
+                event = event_for(seed, company_id)
+                raw_rows, history = generate_statement(
+                    seed, args.rows, args.fanout, args.duplicate_ratio, company_id, mixed_dates=not args.iso_dates)
+                bq_client.files[event["name"]] = raw_rows
+                bq_client.history = {"checksum": history, "etl_checksum": []}
+
+                app.handle_event(event, event["bucket"], event["name"])
+                recorder.finish_file()
+                del bq_client.files[event["name"]]
+            wall_seconds = time.perf_counter() - wall_start
+
+    samples = recorder.samples
+    return {
+        "config": {key: getattr(args, key) for key in
+                   ("files", "rows", "fanout", "duplicate_ratio", "companies", "iso_dates", "config", "name")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "redis": "server" if args.redis_url else "fakeredis", "memory": memory.method},
+        "stages": summarize(samples),
+        "total": {
+            "wall_seconds": wall_seconds,
+            "raw_rows": sum(run["rows_out"] for run in samples["extraction"]),
+            "rows_per_second": sum(run["rows_out"] for run in samples["extraction"]) / wall_seconds if wall_seconds else 0.0,
+            "peak_mb": max(run["peak_mb"] for runs in samples.values() for run in runs),
+            "published_messages": publisher.messages,
+            "published_bytes": publisher.bytes,
+            "bigquery_queries": bq_client.queries,
+            "bigquery_dry_runs": bq_client.dry_runs,
+            "bigquery_estimated_bytes": etl.estimated_bytes(),
+        },
+        "metrics": metrics.snapshot()["counters"],
+    }
+
+
+# --- Reporting --------------------------------------------------------------------
+
+def print_report(results):
+    print(f"{'stage':>16} {'rows in':>9} {'rows out':>9} {'rows/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'growth MB':>10}")
+    for stage, result in results["stages"].items():
+        print(f"{stage:>16} {result['rows_in']:>9} {result['rows_out']:>9} {result['rows_per_second']:>11.0f} "
+              f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['growth_mb']:>10.1f}")
+    total = results["total"]
+    print(f"total: {total['raw_rows']} raw rows in {total['wall_seconds']:.2f}s "
+          f"({total['rows_per_second']:.0f} rows/s), {total['published_messages']} messages published, "
+          f"peak {total['peak_mb']:.1f} MB ({results['environment']['memory']})")
+
+
+def compare(results, baseline, threshold):
+    """Devuelve las regresiones frente a ``baseline`` que superan ``threshold`` (fracción)."""
+    regressions = []
+    checks = [("rows_per_second", -1), ("p99_ms", 1)]
+    # Los picos de RSS y de tracemalloc no son comparables entre sí
+    if baseline.get("environment", {}).get("memory") == results["environment"]["memory"]:
+        checks.append(("growth_mb", 1))
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for metric, direction in checks:
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change * direction > threshold:
+                regressions.append(f"{stage}.{metric}: {before:.2f} -> {after:.2f} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20, help="Archivos (eventos) a procesar")
+    parser.add_argument("--rows", type=int, default=2000, help="Transacciones por archivo")
+    parser.add_argument("--fanout", type=int, default=2, help="Entradas de metadata por transacción")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="Fracción ya presente en el histórico")
+    parser.add_argument("--companies", type=int, default=3)
+    parser.add_argument("--iso-dates", action="store_true", help="Solo fechas YYYY-MM-DD")
+    parser.add_argument("--config", default="config/transactions.yaml")
+    parser.add_argument("--name", default="transactions")
+    parser.add_argument("--redis-url", help="Servidor Redis en lugar de fakeredis (se hace FLUSHDB)")
+    parser.add_argument("--output", help="Escribe los resultados en JSON")
+    parser.add_argument("--compare", help="Resultados JSON de referencia")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Tolerancia de regresión (fracción)")
+    parser.add_argument("--verbose", action="store_true", help="Mantiene los logs INFO del pipeline (afectan los tiempos)")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    results = run_benchmark(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("config") != results["config"]:
+            print("WARNING benchmark configuration differs from the baseline")
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions above {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
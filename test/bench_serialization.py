@@ -0,0 +1,109 @@
+"""
+Compatibility check and speed benchmark for the Pub/Sub payload serialization.
+
+Verifies that the stdlib path of src.serialization reproduces the legacy
+json.dumps(prepare_for_pubsub(row)) bytes exactly, that the orjson path (the
+default) decodes to the same document, and times both against the legacy
+copy+pop+json.dumps path. The checked rows include non-ASCII text (\\u-escaped by
+json, raw UTF-8 with orjson), Decimal amounts (text on both paths) and NaN
+amounts, which the orjson path writes as null by design (see src.serialization).
+
+Usage:
+    PYTHONPATH=. python test/bench_serialization.py --rows 100000
+"""
+import argparse
+import json
+import math
+import time
+from decimal import Decimal
+
+from bench_transaction import make_rows
+from etl.loads.pubsub import prepare_for_pubsub, encode_for_pubsub
+from src import serialization
+from theetl.transaction import Transaction
+
+
+def legacy_payload(transaction, default=None):
+    """
+    Payload tal como lo generaba la versión anterior (copy + pop + json.dumps).
+    ``default`` solo se usa en la comprobación, para filas con Decimal que la versión
+    anterior no podía publicar.
+    """
+    transaction_data = transaction.copy()
+    metadata = transaction_data.get('metadata', [])
+    if isinstance(metadata, list) and metadata:
+        transaction_data['metadata'] = {item['key']: item['value'] for item in metadata}
+    else:
+        transaction_data['metadata'] = {}
+    transaction_data.pop('created_at', None)
+    transaction_data.pop('etl_checksum', None)
+    if default is None:
+        return json.dumps(transaction_data).encode("utf-8")
+    return json.dumps(transaction_data, default=default).encode("utf-8")
+
+
+def with_edge_cases(rows):
+    """Agrega filas con texto no ASCII, importes Decimal y NaN."""
+    edge_rows = []
+    for i, row in enumerate(rows[:30]):
+        row = dict(row)
+        if i % 3 == 0:
+            row['concept'] = f"DEPÓSITO ÁREA Nº{i} — pago 日本 \u2028"
+            row['account_alias'] = "Ñandú"
+        elif i % 3 == 1:
+            row['amount'] = Decimal("1.50") if i % 2 else Decimal("-12345678901234567890.123456")
+            row['reported_remaining'] = Decimal("0.00")
+        else:
+            row['amount'] = float("nan")
+            row['reported_remaining'] = float("inf")
+        edge_rows.append(row)
+    return edge_rows
+
+
+def without_non_finite(value):
+    """Documento esperado en la ruta orjson: NaN/Infinity se escriben como null."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: without_non_finite(item) for key, item in value.items()}
+    return value
+
+
+def check_compatibility(rows):
+    for row in rows:
+        expected = legacy_payload(row, default=serialization.json_default)
+        message = prepare_for_pubsub(Transaction.from_dict(row))
+        assert serialization.dumps(message, encoder="json") == expected, row['checksum']
+        decoded = json.loads(serialization.dumps(message))
+        assert decoded == without_non_finite(json.loads(expected)), row['checksum']
+        if serialization.JSON_ENCODER == "orjson":
+            assert b"NaN" not in serialization.dumps(message), "orjson path wrote a NaN token"
+    print(f"compatibility: {len(rows)} rows byte-identical (json), equivalent ({serialization.JSON_ENCODER})")
+
+
+def timed(label, func, rows):
+    start = time.perf_counter()
+    total = sum(len(func(row)) for row in rows)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28}: {elapsed * 1000:8.1f} ms  {len(rows) / elapsed:10.0f} rows/s  {total / len(rows):.0f} B/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    # Include list metadata so the key/value conversion path is exercised too.
+    for row in rows[::10]:
+        row['metadata'] = [{'key': 'reference', 'value': row['checksum'][:8]}]
+    check_compatibility(rows[:1000] + with_edge_cases(rows))
+
+    records = [Transaction.from_dict(row) for row in rows]
+    timed("legacy dict json.dumps", legacy_payload, rows)
+    timed("Transaction encode_for_pubsub", lambda row: encode_for_pubsub(row)[0], records)
+    timed("Transaction json encoder", lambda row: serialization.dumps(prepare_for_pubsub(row), encoder="json"), records)
+
+
+if __name__ == "__main__":
+    main()
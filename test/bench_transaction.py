@@ -0,0 +1,103 @@
+"""
+Memory and speed benchmark: dict rows vs theetl.transaction.Transaction records.
+
+Usage:
+    PYTHONPATH=. python test/bench_transaction.py --rows 100000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from theetl.transaction import Transaction, FIELDS
+
+
+BANKS = ["BBVA", "SANTANDER", "BANORTE", "HSBC"]
+CURRENCIES = ["MXN", "USD"]
+
+
+def make_rows(n, accounts=20):
+    """Genera filas transformadas sintéticas como dicts (strings repetidos sin internar)."""
+    rng = random.Random(42)
+    companies = [f"company-{i}" for i in range(3)]
+    rows = []
+    for i in range(n):
+        account = rng.randrange(accounts)
+        rows.append({
+            'checksum': f"{i:032x}",
+            'etl_checksum': f"{i * 7:032x}",
+            'concept': f"PAGO REFERENCIA {rng.randrange(10**6)}",
+            'amount': round(rng.uniform(-5000, 5000), 2),
+            # Build new str objects per row, as a JSON/BigQuery decoder would.
+            'account_number': "".join(["00120", str(account)]),
+            'bank': "".join([BANKS[account % len(BANKS)]]),
+            'account_alias': "".join(["alias-", str(account)]),
+            'currency': "".join([CURRENCIES[account % len(CURRENCIES)]]),
+            'report_type': "".join(["daily"]),
+            'extraction_date': "2024-11-25T18:17:50",
+            'user_id': "".join(["user-", str(account % 5)]),
+            'company_id': "".join([companies[account % len(companies)]]),
+            'transaction_date': f"2024-11-{rng.randrange(1, 29):02d}",
+            'reported_remaining': round(rng.uniform(0, 10**6), 2),
+            'created_at': "".join(["2024-11-25T00:00:00"]),
+            'metadata': {},
+        })
+    return rows
+
+
+def measure(label, build):
+    """Mide tiempo de construcción y memoria retenida (tracemalloc, en una segunda pasada)."""
+    gc.collect()
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"label": label, "seconds": elapsed, "bytes": current, "result": result}
+
+
+def bench_access(rows):
+    """Acceso típico de los filtros: un solo campo por fila."""
+    start = time.perf_counter()
+    checksums = {row['checksum'] for row in rows}
+    return time.perf_counter() - start, len(checksums)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    # Both paths start from freshly decoded dict rows; the Transaction path drops them after conversion.
+    dicts = measure("dict", lambda: make_rows(args.rows))
+    records = measure("Transaction", lambda: [Transaction.from_dict(row) for row in make_rows(args.rows)])
+
+    print(f"rows: {args.rows}  fields: {len(FIELDS)}")
+    for run in (dicts, records):
+        access_seconds, _ = bench_access(run["result"])
+        print(
+            f"{run['label']:>12}: build {run['seconds']:.3f}s  "
+            f"retained {run['bytes'] / 1024 / 1024:.1f} MiB "
+            f"({run['bytes'] / args.rows:.0f} B/row)  "
+            f"checksum scan {access_seconds * 1000:.1f} ms"
+        )
+
+    start = time.perf_counter()
+    for record in records["result"]:
+        record.to_dict(exclude=('created_at', 'etl_checksum'))
+    to_dict_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for row in dicts["result"]:
+        message = row.copy()
+        message.pop('created_at', None)
+        message.pop('etl_checksum', None)
+    copy_seconds = time.perf_counter() - start
+    print(f"pubsub prep: dict copy+pop {copy_seconds * 1000:.1f} ms  Transaction.to_dict {to_dict_seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Checks that a retry served from the extraction cache (src.extraction_cache) is
+indistinguishable from the original extraction.
+
+Covers: raw rows with NUMERIC amounts of varying scale (Decimal('1.5') next to
+Decimal('2.25')), ints mixed with floats, NaN, timezone-aware timestamps, dates,
+non-ASCII text and nulls come back with the same type and value, and the
+transformed rows (etl_checksum included) and Pub/Sub payloads of a cache hit
+equal those of the miss; empty results are not cached; a directory that is not
+private to the user disables the cache.
+
+Usage:
+    PYTHONPATH=. python test/cache_replay.py
+"""
+import argparse
+import logging
+import math
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
+
+from bench_pipeline import FakePublisher, event_for, generate_statement
+
+
+def edge_case_rows():
+    raw_rows, _ = generate_statement(7, 200, 1, 0.0, "company-7")
+    for i, row in enumerate(raw_rows):
+        if i % 4 == 0:
+            row['amount'] = Decimal("1.5") if i % 8 else Decimal("2.25")
+            row['reported_remaining'] = Decimal("-1000") if i % 8 else Decimal("0.10")
+        elif i % 4 == 1:
+            row['amount'] = 100 + i  # int entre floats
+        elif i % 4 == 2:
+            row['reported_remaining'] = float("nan")
+        row['extraction_date'] = datetime(2024, 11, 25, 6, i % 60, tzinfo=timezone.utc) if i % 2 else None
+        row['report_day'] = date(2024, 11, 1 + i % 28)
+        row['concept'] = f"DEPÓSITO Nº{i}" if i % 5 == 0 else row['concept']
+    return raw_rows
+
+
+def typed(value):
+    """Representación comparable por tipo y valor (NaN incluido)."""
+    if isinstance(value, float) and math.isnan(value):
+        return (float, "nan")
+    return (type(value), repr(value))
+
+
+def same_rows(left, right):
+    return len(left) == len(right) and all(
+        a.keys() == b.keys() and all(typed(a[key]) == typed(b[key]) for key in a) for a, b in zip(left, right)
+    )
+
+
+def partitions_for(seed):
+    event = event_for(seed, f"company-{seed}")
+    return {"file_name": event["name"], "generation": event["generation"]}
+
+
+def scenario_hit_equals_miss(modules, cache_dir):
+    """Un reintento servido desde la caché produce las mismas filas transformadas."""
+    raw_rows = edge_case_rows()
+    calls = []
+
+    def extraction(partitions):
+        calls.append(partitions)
+        return [dict(row) for row in raw_rows]
+
+    partitions = partitions_for(1)
+    miss = modules.cached(extraction, partitions)
+    hit = modules.cached(extraction, partitions)
+    assert len(calls) == 1, f"extraction ran {len(calls)} times"
+    assert same_rows(hit, miss), "cached raw rows differ in type or value"
+
+    transformed_miss = modules.process_transactions(miss)
+    transformed_hit = modules.process_transactions(hit)
+    assert len(transformed_hit) == len(raw_rows)
+    assert same_rows([row.to_dict() for row in transformed_hit], [row.to_dict() for row in transformed_miss]), \
+        "transformed rows (etl_checksum) differ between hit and miss"
+    payloads_miss = [modules.dumps(modules.prepare_for_pubsub(row)) for row in transformed_miss]
+    payloads_hit = [modules.dumps(modules.prepare_for_pubsub(row)) for row in transformed_hit]
+    assert payloads_hit == payloads_miss, "Pub/Sub payloads differ between hit and miss"
+    return f"{len(hit)} rows, same types, etl_checksums and payloads"
+
+
+def scenario_empty_not_cached(modules, cache_dir):
+    """Una extracción vacía no se guarda: el reintento vuelve a consultar."""
+    calls = []
+
+    def extraction(partitions):
+        calls.append(partitions)
+        return []
+
+    partitions = partitions_for(2)
+    modules.cached(extraction, partitions)
+    modules.cached(extraction, partitions)
+    assert len(calls) == 2, "empty extraction was served from the cache"
+    return "empty result queried again"
+
+
+def scenario_unsafe_dir(modules, cache_dir):
+    """Un directorio con permisos para otros desactiva la caché."""
+    partitions = partitions_for(3)
+    modules.put(partitions, edge_case_rows(), cache_dir=cache_dir)
+    assert modules.get(partitions, cache_dir=cache_dir) is not None
+    os.chmod(cache_dir, 0o777)
+    try:
+        assert modules.get(partitions, cache_dir=cache_dir) is None, "entry read from a world-writable directory"
+    finally:
+        os.chmod(cache_dir, 0o700)
+    return "world-writable directory bypassed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    cache_dir = tempfile.mkdtemp(prefix="replay-extraction-cache-")
+    os.environ["EXTRACTION_CACHE_DIR"] = cache_dir
+    with mock.patch("google.cloud.pubsub_v1.PublisherClient", return_value=FakePublisher()):
+        from etl.loads.pubsub import prepare_for_pubsub
+    from etl.transformations.transactions import process_transactions
+    from src import extraction_cache
+    from src.serialization import dumps
+
+    modules = argparse.Namespace(
+        cached=extraction_cache.cached,
+        get=extraction_cache.get,
+        put=extraction_cache.put,
+        process_transactions=process_transactions,
+        prepare_for_pubsub=prepare_for_pubsub,
+        dumps=dumps,
+    )
+
+    failed = 0
+    for scenario in (scenario_hit_equals_miss, scenario_empty_not_cached, scenario_unsafe_dir):
+        try:
+            detail = scenario(modules, cache_dir)
+            print(f"PASS {scenario.__name__}: {detail}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {scenario.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Checks for the BigQuery byte budget (src.bigquery_cost) with a tiny budget.
+
+Uses the FakeBigQueryClient of bench_pipeline, whose dry runs report
+``bytes_per_row`` per row the query would read, and covers:
+- refuse: the checksum filter raises QueryBudgetExceeded and the real query never runs;
+- reroute: the checksum filter skips the BigQuery dedup, logs it and counts
+  checksum_bigquery_dedup_skipped, while in-budget queries still run;
+- main.process_event with the shipped config: an over-budget file is acked with
+  a 2xx (no Pub/Sub redelivery loop), counted in files_over_budget, not
+  registered as processed and kept in Redis (src.refused_files); once the query
+  fits again it is replayed through main.handle_event and leaves the list;
+- if the refused event cannot be recorded, process_event answers 500 so Pub/Sub
+  redelivers it instead of dropping it.
+
+Usage:
+    PYTHONPATH=. python test/cost_budget.py [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import sys
+import tempfile
+from unittest import mock
+
+from bench_pipeline import FakeBigQueryClient, FakePublisher, event_for, generate_statement, redis_stand_in
+
+
+ROWS = 200
+BYTES_PER_ROW = 100
+
+
+class FakeRequest:
+    def __init__(self, body):
+        self.body = body
+
+    async def json(self):
+        return self.body
+
+
+def load_file(bq_client, seed, history_rows):
+    """Archivo de ROWS filas con un histórico de ``history_rows`` checksums."""
+    company_id = f"company-{seed}"
+    event = event_for(seed, company_id)
+    raw_rows, _ = generate_statement(seed, ROWS, 0, 0.0, company_id)
+    bq_client.files[event["name"]] = raw_rows
+    history = [row['checksum'] for row in raw_rows[:ROWS // 4]]
+    history += [f"old-{i}" for i in range(history_rows - len(history))]
+    bq_client.history = {"checksum": history, "etl_checksum": []}
+    return event
+
+
+def transformed(etl, modules, event):
+    partitions = modules.parse_partitions(event["name"])
+    partitions['file_name'] = event["name"]
+    partitions['generation'] = event["generation"]
+    return etl.run_transformations(etl.run_extraction(partitions))
+
+
+def with_budget(etl, on_exceed):
+    # La extracción (ROWS filas) entra en el presupuesto; la de checksums (4 * ROWS) no
+    etl.cost_control = {"dry_run": True, "max_bytes_per_query": 2 * ROWS * BYTES_PER_ROW, "on_exceed": on_exceed}
+    return etl
+
+
+def scenario_refuse(bq_client, redis_client, modules):
+    """refuse: el filtro lanza QueryBudgetExceeded sin ejecutar la consulta."""
+    etl = with_budget(modules.ETL(modules.config, "transactions"), "refuse")
+    event = load_file(bq_client, 1, 4 * ROWS)
+    transactions = transformed(etl, modules, event)
+    queries_before = bq_client.queries
+    try:
+        etl.run_filters(transactions)
+        raise AssertionError("over-budget checksum query was not refused")
+    except modules.QueryBudgetExceeded as e:
+        assert e.stage == "filters" and e.label == "checksums", (e.stage, e.label)
+    assert bq_client.queries == queries_before, "refused query was executed"
+    actions = [(estimate["stage"], estimate["action"]) for estimate in etl.query_estimates]
+    assert actions == [("extraction", "run"), ("filters", "refused")], actions
+    return "checksum query refused in stage filters, extraction ran"
+
+
+def scenario_reroute(bq_client, redis_client, modules):
+    """reroute: el filtro de BigQuery se omite de forma visible y la etl_checksum sí corre."""
+    etl = with_budget(modules.ETL(modules.config, "transactions"), "reroute")
+    event = load_file(bq_client, 2, 4 * ROWS)
+    transactions = transformed(etl, modules, event)
+    skipped_before = modules.metrics.get("checksum_bigquery_dedup_skipped.checksum")
+    unique = etl.run_filters(transactions)
+    assert len(unique) == len(transactions), "rerouted filter still removed rows"
+    assert modules.metrics.get("checksum_bigquery_dedup_skipped.checksum") == skipped_before + 1, \
+        "rerouted dedup not counted"
+    actions = [(estimate["query"], estimate["action"]) for estimate in etl.query_estimates]
+    assert ("checksums", "rerouted") in actions and ("etl_checksums", "run") in actions, actions
+    return f"checksum dedup skipped and counted, {len(unique)} rows kept"
+
+
+def scenario_event_acked(bq_client, redis_client, modules):
+    """Con la configuración publicada, un archivo fuera de presupuesto responde 2xx."""
+    event = load_file(bq_client, 3, ROWS)
+    event["size"] = "1024"
+    body = {"message": {"data": base64.b64encode(json.dumps(event).encode()).decode()}}
+    bq_client.bytes_per_row = 1024 ** 4  # 1 TiB por fila: supera los 100 GiB de config
+    over_budget_before = modules.metrics.get("files_over_budget")
+    try:
+        response = asyncio.run(modules.process_event(FakeRequest(body)))
+    finally:
+        bq_client.bytes_per_row = BYTES_PER_ROW
+    assert isinstance(response, dict) and "error" in response, response
+    assert modules.metrics.get("files_over_budget") == over_budget_before + 1, "files_over_budget not counted"
+    assert not modules.is_file_processed(redis_client, event), "over-budget file registered as processed"
+
+    entries = modules.refused_files.list_entries(redis_client)
+    refused = [entry for entry in entries if entry["event"] == event]
+    assert len(refused) == 1, f"over-budget event not listed: {entries}"
+    assert refused[0]["stage"] == "extraction" and refused[0]["estimated_bytes"] > refused[0]["max_bytes"], refused[0]
+    assert redis_client.ttl(response["refused_key"]) > 0, "refused entry has no TTL"
+
+    # Presupuesto revisado (aquí: la consulta vuelve a entrar): el reproceso corre el ETL completo
+    published_before = modules.publisher.messages
+    result = modules.refused_files.replay(redis_client, modules.file_id(event), modules.handle_event)
+    assert modules.is_file_processed(redis_client, event), f"replayed file not registered as processed: {result}"
+    published = modules.publisher.messages - published_before
+    assert published == ROWS - ROWS // 4, f"replay published {published} rows (history holds {ROWS // 4}): {result}"
+    assert modules.refused_files.get(redis_client, modules.file_id(event)) is None, "replayed entry still listed"
+    return "acked with 2xx, listed with TTL, replayed through handle_event and removed"
+
+
+def scenario_record_failure(bq_client, redis_client, modules):
+    """Si el evento omitido no se puede registrar, se responde 500 (Pub/Sub reintenta)."""
+    event = load_file(bq_client, 4, ROWS)
+    event["size"] = "1024"
+    body = {"message": {"data": base64.b64encode(json.dumps(event).encode()).decode()}}
+    bq_client.bytes_per_row = 1024 ** 4
+    try:
+        with mock.patch.object(modules.refused_files, "record", side_effect=ConnectionError("redis down")):
+            asyncio.run(modules.process_event(FakeRequest(body)))
+        raise AssertionError("unrecorded over-budget event was acked")
+    except modules.HTTPException as e:
+        assert e.status_code == 500, e.status_code
+    finally:
+        bq_client.bytes_per_row = BYTES_PER_ROW
+    return "500 returned, event left for redelivery"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", help="Servidor Redis en lugar de fakeredis (se hace FLUSHDB)")
+    parser.add_argument("--config", default="config/transactions.yaml")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    os.environ.setdefault("GCP_PROJECT", "budget")
+    os.environ.setdefault("DATASET_NAME", "budget")
+    os.environ.setdefault("TABLE_NAME", "transactions")
+    os.environ["EXTRACTION_CACHE_DIR"] = tempfile.mkdtemp(prefix="budget-extraction-cache-")
+
+    bq_client = FakeBigQueryClient(bytes_per_row=BYTES_PER_ROW)
+    redis_client = redis_stand_in(args.redis_url)
+    publisher = FakePublisher()
+    scenarios = (scenario_refuse, scenario_reroute, scenario_event_acked, scenario_record_failure)
+
+    with mock.patch("google.cloud.bigquery.Client", return_value=bq_client), \
+            mock.patch("google.cloud.pubsub_v1.PublisherClient", return_value=publisher):
+        import main as app
+        from etl.filters import checksum_bigquery
+        from etl.loads import pubsub
+        from fastapi import HTTPException
+        from src import metrics, refused_files, utils
+        from src.checkpoints import file_id
+        from src.bigquery_cost import QueryBudgetExceeded
+        from src.redis_tools import is_file_processed
+
+        checksum_bigquery.client = bq_client
+        pubsub.publisher = publisher
+        app.redis_client = redis_client
+        modules = argparse.Namespace(
+            config=args.config,
+            ETL=app.ETL,
+            QueryBudgetExceeded=QueryBudgetExceeded,
+            parse_partitions=utils.parse_partitions,
+            process_event=app.process_event,
+            handle_event=app.handle_event,
+            HTTPException=HTTPException,
+            refused_files=refused_files,
+            file_id=file_id,
+            publisher=publisher,
+            is_file_processed=is_file_processed,
+            metrics=metrics,
+        )
+
+        failed = 0
+        for scenario in scenarios:
+            try:
+                detail = scenario(bq_client, redis_client, modules)
+                print(f"PASS {scenario.__name__}: {detail}")
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL {scenario.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
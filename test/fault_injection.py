@@ -0,0 +1,225 @@
+"""
+Fault-injection checks for checkpointed loads and deferred checksum commits.
+
+Runs main.handle_event itself against the stand-ins of bench_pipeline and
+injects failures: Pub/Sub publishes failing mid-file, a failing sink after a
+successful one, and Redis failing while committing checksums after the loads.
+Every scenario retries the file until it succeeds and checks that no unique
+transaction is lost, that committed batches are not loaded again and that the
+checksums are only marked as processed once all loads finished, so a change in
+the order of main.handle_event fails the suite.
+
+Usage:
+    PYTHONPATH=. python test/fault_injection.py [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import tempfile
+from collections import Counter
+from unittest import mock
+
+from bench_pipeline import FakeBigQueryClient, FakePublisher, event_for, generate_statement, redis_stand_in
+
+
+ROWS = 1000
+BATCH_SIZE = 100
+
+
+class InjectedFailure(Exception):
+    pass
+
+
+def published_checksums(publisher):
+    return Counter(json.loads(data)['checksum'] for data in publisher.published)
+
+
+def transformed_rows(etl, event, modules):
+    partitions = modules.parse_partitions(event["name"])
+    partitions['file_name'] = event["name"]
+    partitions['generation'] = event["generation"]
+    return etl.run_transformations(etl.run_extraction(partitions))
+
+
+def run_file(etl, event, modules, before_commit=None):
+    """
+    Procesa el archivo con main.handle_event usando ``etl`` y lotes de BATCH_SIZE;
+    ``before_commit`` se llama antes de marcar los checksums como procesados.
+    """
+    def mark_processed(redis_client, rows):
+        if before_commit:
+            before_commit()
+        return modules.mark_processed(redis_client, rows)
+
+    with mock.patch.object(modules.app, "ETL", lambda *_: etl), \
+            mock.patch.object(modules.app, "Checkpoint", functools.partial(modules.Checkpoint, batch_size=BATCH_SIZE)), \
+            mock.patch.object(modules.app, "mark_processed", mark_processed):
+        return modules.app.handle_event(event, event["bucket"], event["name"])
+
+
+def retry_until_success(run, attempts=5):
+    failures = 0
+    for _ in range(attempts):
+        try:
+            return run(), failures
+        except Exception as e:
+            failures += 1
+            logging.warning(f"attempt failed: {e}")
+    raise AssertionError(f"file did not succeed after {attempts} attempts")
+
+
+def scenario_publish_failure(etl, redis_client, bq_client, publisher, modules, seed):
+    """Falla un mensaje del 6º lote: se reintenta solo desde ese lote."""
+    event, expected = load_file(bq_client, seed)
+    failed_once = set()
+
+    def fail_when(n, data):
+        checksum = json.loads(data)['checksum']
+        if n == 5 * BATCH_SIZE + 17 and checksum not in failed_once:
+            failed_once.add(checksum)
+            return True
+        return False
+
+    publisher.fail_when = fail_when
+    _, failures = retry_until_success(lambda: run_file(etl, event, modules))
+    publisher.fail_when = None
+
+    published = published_checksums(publisher)
+    assert failures == 1, failures
+    assert set(published) == expected, "a unique transaction was lost"
+    republished = sum(count - 1 for count in published.values())
+    # Solo el lote que falló se vuelve a publicar (at-least-once dentro del lote)
+    assert republished == BATCH_SIZE - 1, republished
+    assert not modules.filter_unseen(redis_client, transformed_rows(etl, event, modules)), \
+        "checksums not committed after success"
+    assert modules.is_file_processed(redis_client, event), "file not registered as processed"
+    return f"1 failure, resumed at batch 6, {republished} messages republished"
+
+
+def scenario_failing_second_sink(etl, redis_client, bq_client, publisher, modules, seed):
+    """El primer sink carga todo y el segundo falla: el reintento no repite el primero."""
+    event, expected = load_file(bq_client, seed)
+    first_sink_rows = Counter()
+    push = etl.loads[etl.load_names.index("push")]
+    state = {"fail": True}
+
+    def first_sink(data):
+        first_sink_rows.update(row['checksum'] for row in data)
+
+    def second_sink(data):
+        if state["fail"]:
+            state["fail"] = False
+            raise InjectedFailure("second sink down")
+        push(data)
+
+    with mock.patch.object(etl, "loads", [first_sink, second_sink]), \
+            mock.patch.object(etl, "load_names", ["first_sink", "second_sink"]):
+        # Antes de cargar, ningún checksum debe estar marcado aunque el intento falle.
+        # Se consulta con las filas transformadas reales: company_id y transaction_date
+        # definen la partición de Redis donde se guardan los checksums.
+        try:
+            run_file(etl, event, modules)
+            raise AssertionError("second sink should have failed")
+        except InjectedFailure:
+            pass
+        registered_after_failure = modules.is_file_processed(redis_client, event)
+        probe = transformed_rows(etl, event, modules)
+        still_unseen = modules.filter_unseen(redis_client, probe)
+        retry_until_success(lambda: run_file(etl, event, modules))
+        unseen_after_success = modules.filter_unseen(redis_client, probe)
+
+    assert {row['checksum'] for row in probe} == expected
+    assert len(still_unseen) == len(expected), "checksums were marked before the loads finished"
+    assert not registered_after_failure, "file registered as processed after a failed load"
+    assert not unseen_after_success, f"{len(unseen_after_success)} checksums not committed after success"
+    assert set(first_sink_rows) == expected and max(first_sink_rows.values()) == 1, "first sink reloaded rows"
+    assert set(published_checksums(publisher)) >= expected
+    return f"first sink loaded {len(first_sink_rows)} rows once, second sink resumed"
+
+
+def scenario_redis_commit_failure(etl, redis_client, bq_client, publisher, modules, seed):
+    """Redis falla al marcar checksums tras cargar: el reintento no vuelve a cargar nada."""
+    event, expected = load_file(bq_client, seed)
+    state = {"fail": True}
+
+    def before_commit():
+        if state["fail"]:
+            state["fail"] = False
+            raise InjectedFailure("redis timeout")
+
+    messages_before = publisher.messages
+    _, failures = retry_until_success(lambda: run_file(etl, event, modules, before_commit=before_commit))
+    published = publisher.messages - messages_before
+    assert failures == 1, failures
+    assert published == len(expected), f"{published} messages for {len(expected)} transactions"
+    assert modules.is_file_processed(redis_client, event), "file not registered as processed"
+    return f"retry skipped all {len(expected)} committed rows"
+
+
+def load_file(bq_client, seed):
+    company_id = f"company-{seed}"
+    event = event_for(seed, company_id)
+    raw_rows, history = generate_statement(seed, ROWS, 2, 0.0, company_id)
+    bq_client.files[event["name"]] = raw_rows
+    bq_client.history = {"checksum": history, "etl_checksum": []}
+    return event, {row['checksum'] for row in raw_rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", help="Servidor Redis en lugar de fakeredis (se hace FLUSHDB)")
+    parser.add_argument("--config", default="config/transactions.yaml")
+    parser.add_argument("--name", default="transactions")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    os.environ.setdefault("GCP_PROJECT", "faults")
+    os.environ.setdefault("DATASET_NAME", "faults")
+    os.environ.setdefault("TABLE_NAME", "transactions")
+    os.environ.setdefault("TOPIC_IN", "faults-transactions")
+    os.environ["EXTRACTION_CACHE_DIR"] = tempfile.mkdtemp(prefix="faults-extraction-cache-")
+
+    bq_client = FakeBigQueryClient()
+    redis_client = redis_stand_in(args.redis_url)
+    scenarios = (scenario_publish_failure, scenario_failing_second_sink, scenario_redis_commit_failure)
+
+    with mock.patch("google.cloud.bigquery.Client", return_value=bq_client), \
+            mock.patch("google.cloud.pubsub_v1.PublisherClient", return_value=FakePublisher()):
+        import main as app
+        from etl.filters import checksum_bigquery
+        from src import checkpoints, checksum_store, pubsub, redis_tools, utils
+        from theetl.etl import ETL
+
+        modules = argparse.Namespace(
+            app=app,
+            parse_partitions=utils.parse_partitions,
+            filter_unseen=checksum_store.filter_unseen,
+            mark_processed=checksum_store.mark_processed,
+            is_file_processed=redis_tools.is_file_processed,
+            Checkpoint=checkpoints.Checkpoint,
+        )
+        checksum_bigquery.client = bq_client
+        app.redis_client = redis_client
+
+        failed = 0
+        for seed, scenario in enumerate(scenarios):
+            publisher = FakePublisher(record=True)
+            pubsub.publisher = publisher
+            etl = ETL(args.config, args.name)
+            try:
+                detail = scenario(etl, redis_client, bq_client, publisher, modules, seed)
+                print(f"PASS {scenario.__name__}: {detail}")
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL {scenario.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
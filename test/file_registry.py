@@ -0,0 +1,120 @@
+"""
+Checks for the processed-file registry in src.redis_tools.
+
+Runs is_file_processed / mark_file_processed against fakeredis (or a local Redis
+with --redis-url) and covers: a hit by generation, a hit by md5Hash + size for a
+new generation of the same content, a miss once the TTL expired, events without
+generation nor md5Hash, and the files_skipped counter of main.handle_event.
+
+Usage:
+    PYTHONPATH=. python test/file_registry.py [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from unittest import mock
+
+from bench_pipeline import FakeBigQueryClient, FakePublisher, event_for, redis_stand_in
+
+
+def scenario_generation_hit(redis_client, modules):
+    """El mismo objeto (misma generación) ya registrado se reconoce."""
+    event = event_for(1, "company-1")
+    assert not modules.is_file_processed(redis_client, event), "unseen file reported as processed"
+    modules.mark_file_processed(redis_client, event)
+    assert modules.is_file_processed(redis_client, event), "same generation not detected"
+    assert redis_client.exists(modules.file_fingerprint_keys(event)[0]), "generation key not stored"
+    return "same generation detected"
+
+
+def scenario_content_hit(redis_client, modules):
+    """Otra generación con el mismo md5Hash y size se reconoce; con otro size no."""
+    event = event_for(2, "company-2")
+    modules.mark_file_processed(redis_client, event)
+    reuploaded = dict(event, generation=str(int(event["generation"]) + 1))
+    changed = dict(reuploaded, size="1024")
+    assert modules.is_file_processed(redis_client, reuploaded), "same content with a new generation not detected"
+    assert not modules.is_file_processed(redis_client, changed), "different size reported as processed"
+    return "re-upload with same md5Hash+size detected, different size not"
+
+
+def scenario_ttl_expiry(redis_client, modules):
+    """Pasado el TTL el archivo vuelve a procesarse."""
+    event = event_for(3, "company-3")
+    modules.mark_file_processed(redis_client, event, ttl=1)
+    assert modules.is_file_processed(redis_client, event)
+    time.sleep(1.2)
+    assert not modules.is_file_processed(redis_client, event), "fingerprint still present after TTL"
+    return "miss after 1s TTL"
+
+
+def scenario_no_fingerprint(redis_client, modules):
+    """Sin generation ni md5Hash no hay claves: nunca se omite ni se registra."""
+    event = {"bucket": "bucket", "name": "year=2024/month=11/day=1/company_id=c/statement.avro"}
+    keys_before = redis_client.dbsize()
+    assert modules.file_fingerprint_keys(event) == []
+    modules.mark_file_processed(redis_client, event)
+    assert redis_client.dbsize() == keys_before, "event without fingerprint wrote keys"
+    assert not modules.is_file_processed(redis_client, event), "event without fingerprint reported as processed"
+    return "no keys, never skipped"
+
+
+def scenario_files_skipped(redis_client, modules):
+    """handle_event no vuelve a extraer un archivo registrado y cuenta files_skipped."""
+    event = event_for(5, "company-5")
+    modules.mark_file_processed(redis_client, event)
+    skipped_before = modules.metrics.get("files_skipped")
+    with mock.patch.object(modules.ETL, "run_extraction", side_effect=AssertionError("extraction ran")):
+        response = modules.handle_event(event, event["bucket"], event["name"])
+    assert modules.metrics.get("files_skipped") == skipped_before + 1, "files_skipped not incremented"
+    assert "omite" in response["message"], response
+    return "files_skipped incremented, extraction not run"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", help="Servidor Redis en lugar de fakeredis (se hace FLUSHDB)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    os.environ.setdefault("GCP_PROJECT", "registry")
+    os.environ.setdefault("DATASET_NAME", "registry")
+    os.environ.setdefault("TABLE_NAME", "transactions")
+
+    redis_client = redis_stand_in(args.redis_url)
+    scenarios = (scenario_generation_hit, scenario_content_hit, scenario_ttl_expiry,
+                 scenario_no_fingerprint, scenario_files_skipped)
+
+    with mock.patch("google.cloud.bigquery.Client", return_value=FakeBigQueryClient()), \
+            mock.patch("google.cloud.pubsub_v1.PublisherClient", return_value=FakePublisher()):
+        import main as app
+        from src import metrics, redis_tools
+
+        app.redis_client = redis_client
+        modules = argparse.Namespace(
+            file_fingerprint_keys=redis_tools.file_fingerprint_keys,
+            is_file_processed=redis_tools.is_file_processed,
+            mark_file_processed=redis_tools.mark_file_processed,
+            handle_event=app.handle_event,
+            ETL=app.ETL,
+            metrics=metrics,
+        )
+
+        failed = 0
+        for scenario in scenarios:
+            try:
+                detail = scenario(redis_client, modules)
+                print(f"PASS {scenario.__name__}: {detail}")
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL {scenario.__name__}: {e}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import yaml
 import importlib
 import logging
+from src import bigquery_cost
 
 # Setup basic configuration for logging
 logging.basicConfig(level=logging.INFO)
@@ -19,6 +20,8 @@ class ETL:
         filter_names (list): A list of names for the filter functions.
         extraction (function): The extraction function.
         extraction_name (str): The name of the extraction function.
+        cost_control (dict): BigQuery cost settings (dry_run, max_bytes_per_query, on_exceed).
+        query_estimates (list): Dry-run byte estimates recorded for each BigQuery query, per stage.
     """
 
     def __init__(self, config_path, config_name):
@@ -29,6 +32,8 @@ class ETL:
             config_path (str): The file path to the YAML configuration file.
             config_name (str): The specific configuration name to load.
         """
+        self.cost_control = {}
+        self.query_estimates = []
         configs = self.read_yaml(config_path)
         if configs:
             config = next((item for item in configs if item.get('name') == config_name), None)
@@ -37,6 +42,7 @@ class ETL:
                 self.transformations, self.transformation_names = self.load_module_functions(config.get('transformations', []))
                 self.filters, self.filter_names = self.load_module_functions(config.get('filters', []))
                 self.extraction, self.extraction_name = self.load_module_function(config.get('extraction'))
+                self.cost_control = config.get('cost_control') or {}
                 logging.info(f"ETL configuration loaded: {config_name}")
             else:
                 logger.error(f"No configuration found with the name: {config_name}")
@@ -116,6 +122,30 @@ class ETL:
         """
         return getattr(self, f"{function_type}_names", [])
 
+    def cost_guard(self, stage):
+        """
+        Returns a context manager that applies the BigQuery cost settings to the queries of a stage.
+
+        Parameters:
+            stage (str): The stage name used in the cost report (e.g., 'extraction', 'filters').
+
+        Returns:
+            A context manager from src.bigquery_cost.guard.
+        """
+        return bigquery_cost.guard(stage, estimates=self.query_estimates, **self.cost_control)
+
+    def estimated_bytes(self):
+        """
+        Returns the total estimated bytes processed per stage from the recorded dry runs.
+
+        Returns:
+            dict: Stage name to estimated bytes.
+        """
+        totals = {}
+        for estimate in self.query_estimates:
+            totals[estimate['stage']] = totals.get(estimate['stage'], 0) + estimate['estimated_bytes']
+        return totals
+
     def run_extraction(self, data):
         """
         Runs the extraction function if configured.
@@ -127,7 +157,8 @@ class ETL:
             The result of the extraction function or None.
         """
         if self.extraction:
-            return self.extraction(data)
+            with self.cost_guard('extraction'):
+                return self.extraction(data)
         logger.error("Extraction function not configured.")
 
     def run_transformations(self, data):
@@ -140,8 +171,9 @@ class ETL:
         Returns:
             The transformed data.
         """
-        for transformation in self.transformations:
-            data = transformation(data)
+        with self.cost_guard('transformations'):
+            for transformation in self.transformations:
+                data = transformation(data)
         return data
 
     def run_filters(self, data):
@@ -154,19 +186,42 @@ class ETL:
         Returns:
             The filtered data.
         """
-        for filter_func in self.filters:
-            data = filter_func(data)
+        with self.cost_guard('filters'):
+            for filter_func in self.filters:
+                data = filter_func(data)
         return data
 
-    def run_loads(self, data):
+    def run_loads(self, data, checkpoint=None):
         """
         Runs all configured load functions on the data.
 
+        With a checkpoint, each load runs in batches of ``checkpoint.batch_size`` rows
+        (or of its own ``batch_size`` attribute, for sinks that write one output per
+        call), skips the rows it already committed in a previous attempt and commits
+        every batch right after it succeeds. A failing batch raises, leaving the
+        committed batches recorded so a retry resumes from there.
+
         Parameters:
             data: The data to load.
-        """
-        for load in self.loads:
-            load(data)
+            checkpoint: Optional checkpoint (e.g., src.checkpoints.Checkpoint) with
+                committed(sink), commit(sink, rows), row_key(row) and batch_size.
+        """
+        with self.cost_guard('loads'):
+            if checkpoint is None:
+                for load in self.loads:
+                    load(data)
+                return
+
+            for load, name in zip(self.loads, self.load_names):
+                committed = checkpoint.committed(name)
+                pending = [row for row in data if checkpoint.row_key(row) not in committed]
+                if committed:
+                    logger.info(f"Load {name}: resuming, {len(data) - len(pending)} rows already committed")
+                batch_size = getattr(load, 'batch_size', None) or checkpoint.batch_size
+                for start in range(0, len(pending), batch_size):
+                    batch = pending[start:start + batch_size]
+                    load(batch)
+                    checkpoint.commit(name, batch)
 
     def run_etl(self, data):
         """
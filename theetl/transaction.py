@@ -0,0 +1,166 @@
+import sys
+from operator import attrgetter
+
+
+FIELDS = (
+    'checksum',
+    'etl_checksum',
+    'concept',
+    'amount',
+    'account_number',
+    'bank',
+    'account_alias',
+    'currency',
+    'report_type',
+    'extraction_date',
+    'user_id',
+    'company_id',
+    'transaction_date',
+    'reported_remaining',
+    'created_at',
+    'metadata',
+)
+INDEX = frozenset(FIELDS)
+_values = attrgetter(*FIELDS)
+
+# Low-cardinality fields repeated across every row of a statement.
+INTERNED_FIELDS = frozenset((
+    'account_number',
+    'bank',
+    'account_alias',
+    'currency',
+    'report_type',
+    'user_id',
+    'company_id',
+    'created_at',
+))
+
+
+def intern_value(value):
+    """Interns strings so repeated values share a single object."""
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+class Transaction:
+    """
+    Compact record for a transformed transaction, used between ETL stages.
+
+    Slots avoid the per-instance ``__dict__`` of a plain dict row and the values in
+    ``INTERNED_FIELDS`` share one string object across all rows of a file. The
+    class supports read-only mapping access (``row['checksum']``, ``row.get(...)``)
+    so stages written against dict rows keep working unchanged.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, checksum, etl_checksum=None, concept='', amount=0,
+                 account_number='', bank='', account_alias='', currency='',
+                 report_type='', extraction_date=None, user_id='', company_id='',
+                 transaction_date=None, reported_remaining=0, created_at=None,
+                 metadata=None):
+        self.checksum = checksum
+        self.etl_checksum = etl_checksum
+        self.concept = concept
+        self.amount = amount
+        self.account_number = intern_value(account_number)
+        self.bank = intern_value(bank)
+        self.account_alias = intern_value(account_alias)
+        self.currency = intern_value(currency)
+        self.report_type = intern_value(report_type)
+        self.extraction_date = extraction_date
+        self.user_id = intern_value(user_id)
+        self.company_id = intern_value(company_id)
+        self.transaction_date = transaction_date
+        self.reported_remaining = reported_remaining
+        self.created_at = intern_value(created_at)
+        self.metadata = metadata if metadata is not None else {}
+
+    @classmethod
+    def from_dict(cls, row):
+        """
+        Builds a Transaction from a dict row, ignoring unknown keys.
+
+        Parameters:
+            row (dict): A transformed transaction row.
+
+        Returns:
+            Transaction: The compact record.
+        """
+        return cls(**{field: row[field] for field in FIELDS if field in row})
+
+    def to_dict(self, exclude=()):
+        """
+        Converts the record back to a dict row.
+
+        Parameters:
+            exclude (iterable of str): Field names to leave out of the result.
+
+        Returns:
+            dict: The transaction as a dict with the fields in ``FIELDS`` order.
+        """
+        row = {
+            'checksum': self.checksum,
+            'etl_checksum': self.etl_checksum,
+            'concept': self.concept,
+            'amount': self.amount,
+            'account_number': self.account_number,
+            'bank': self.bank,
+            'account_alias': self.account_alias,
+            'currency': self.currency,
+            'report_type': self.report_type,
+            'extraction_date': self.extraction_date,
+            'user_id': self.user_id,
+            'company_id': self.company_id,
+            'transaction_date': self.transaction_date,
+            'reported_remaining': self.reported_remaining,
+            'created_at': self.created_at,
+            'metadata': self.metadata,
+        }
+        for field in exclude:
+            row.pop(field, None)
+        return row
+
+    def __getitem__(self, key):
+        if key not in INDEX:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in INDEX
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def get(self, key, default=None):
+        if key not in INDEX:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return FIELDS
+
+    def items(self):
+        return zip(FIELDS, _values(self))
+
+    def __eq__(self, other):
+        if isinstance(other, Transaction):
+            return _values(self) == _values(other)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Transaction({self.to_dict()!r})"
+
+
+def to_transactions(rows):
+    """Converts dict rows to Transaction records; existing records pass through."""
+    return [row if isinstance(row, Transaction) else Transaction.from_dict(row) for row in rows]
+